@@ -0,0 +1,174 @@
+import sys
+import time
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from bulkload import IN_CHUNK_SIZE, chunked
+from model.orm import Address, Base, BlogPost, User
+
+# users column -> the table whose rows it counts, by user_id
+COUNTERS = OrderedDict(
+    [("address_count", Address.__table__), ("post_count", BlogPost.__table__)]
+)
+
+
+def counted(counter):
+    users = User.__table__
+    table = COUNTERS[counter]
+    return (
+        select([func.count(table.c.id)])
+        .where(table.c.user_id == users.c.id)
+        .as_scalar()
+    )
+
+
+def counters_of(table):
+    """The counters counting the rows of table, a Table or its name."""
+    name = getattr(table, "name", table)
+    return [
+        counter
+        for counter, counted_table in COUNTERS.items()
+        if counted_table.name == name
+    ]
+
+
+def rebuild(conn, counters=tuple(COUNTERS), user_ids=None):
+    """Recompute the counters from scratch, e.g. after Core bulk loads.
+
+    Core statements bypass the flush events that keep them up to date.
+    user_ids limits the UPDATE to these users.
+    """
+    users = User.__table__
+    values = {counter: counted(counter) for counter in counters}
+    if user_ids is None:
+        conn.execute(users.update().values(values))
+        return
+    user_ids = sorted(user_id for user_id in set(user_ids) if user_id is not None)
+    for chunk in chunked(user_ids, IN_CHUNK_SIZE):
+        conn.execute(users.update().where(users.c.id.in_(chunk)).values(values))
+
+
+def recount(conn, user_ids, counters=tuple(COUNTERS)):
+    """rebuild() the counters of user_ids after a Core write to what they count.
+
+    Counters the database does not have, as in the schema of core.py, are
+    skipped. Returns the counters rebuilt.
+    """
+    if not counters:
+        return []
+    present = set(column["name"] for column in inspect(conn).get_columns("users"))
+    counters = [counter for counter in counters if counter in present]
+    if counters:
+        rebuild(conn, counters, user_ids)
+    return counters
+
+
+def verify(conn, counters=tuple(COUNTERS)):
+    """(user id, counter, stored, actual) for every counter that is off."""
+    users = User.__table__
+    mismatches = []
+    for counter in counters:
+        expected = counted(counter)
+        for user_id, stored, actual in conn.execute(
+            select([users.c.id, users.c[counter], expected]).where(
+                users.c[counter] != expected
+            )
+        ):
+            mismatches.append((user_id, counter, stored, actual))
+    return mismatches
+
+
+def counts(conn, user_id):
+    """The counters of one user, read from its row."""
+    users = User.__table__
+    row = conn.execute(
+        select([users.c[counter] for counter in COUNTERS]).where(users.c.id == user_id)
+    ).fetchone()
+    return dict(zip(COUNTERS, row)) if row is not None else None
+
+
+def address_counts(conn):
+    """The core.py GROUP BY the counters replace, for comparison."""
+    addresses = Address.__table__
+    return conn.execute(
+        select([addresses.c.user_id, func.count(addresses.c.id)])
+        .group_by(addresses.c.user_id)
+        .order_by(addresses.c.user_id)
+    ).fetchall()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] in ("verify", "rebuild"):
+        # python aggregates.py verify|rebuild URL
+        engine = create_engine(sys.argv[2])
+        with engine.begin() as conn:
+            if sys.argv[1] == "rebuild":
+                rebuild(conn)
+            mismatches = verify(conn)
+        for mismatch in mismatches:
+            print("user %d: %s is %d, should be %d" % mismatch)
+        print("%d mismatches" % len(mismatches))
+        sys.exit(1 if mismatches else 0)
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ):
+            conn.execute(Address.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i, "headline": "post %d" % i} for i in range(count)
+        ):
+            conn.execute(BlogPost.__table__.insert(), chunk)
+
+    print("----------------------------------------")
+    print("Verify and rebuild (%d users)" % count)
+    print("----------------------------------------")
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        mismatches = verify(conn)
+        print(
+            "after Core loads: %d mismatches in %.3f s"
+            % (len(mismatches), time.perf_counter() - start)
+        )
+        start = time.perf_counter()
+        rebuild(conn)
+        print("rebuild():        %.3f s" % (time.perf_counter() - start))
+
+    session = sessionmaker(bind=engine)()
+    for user in session.query(User).filter(User.id < 100):
+        user.addresses.append(Address(email_address="new@example.com"))
+        user.posts.append(BlogPost("new", "", user))
+    for address in session.query(Address).filter(Address.user_id < 50):
+        session.delete(address)
+    for post in session.query(BlogPost).filter(BlogPost.user_id < 50):
+        post.user_id = 0
+    session.commit()
+    with engine.connect() as conn:
+        print("after ORM writes: %d mismatches" % len(verify(conn)))
+
+    print("----------------------------------------")
+    print("Address counts")
+    print("----------------------------------------")
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        address_counts(conn)
+        print("GROUP BY, all users: %.3f ms" % ((time.perf_counter() - start) * 1000))
+        start = time.perf_counter()
+        for i in range(1000):
+            counts(conn, i)
+        print(
+            "counts(), per user:  %.3f ms"
+            % ((time.perf_counter() - start) * 1000 / 1000)
+        )
@@ -0,0 +1,120 @@
+import sys
+import time
+
+from sqlalchemy import and_, bindparam, create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.util import identity_key
+
+from bulkload import CHUNK_SIZE, chunked
+from model.orm import Base, BlogPost, Keyword, User, post_keywords
+
+insert_pair = post_keywords.insert().prefix_with("OR IGNORE")
+
+delete_pair = post_keywords.delete().where(
+    and_(
+        post_keywords.c.post_id == bindparam("post_id"),
+        post_keywords.c.keyword_id == bindparam("keyword_id"),
+    )
+)
+
+
+def expire_collections(session, post_ids, keyword_ids):
+    """Expire BlogPost.keywords and Keyword.posts wherever they are loaded."""
+    for cls, key, ids in (
+        (BlogPost, "keywords", post_ids),
+        (Keyword, "posts", keyword_ids),
+    ):
+        for id in ids:
+            instance = session.identity_map.get(identity_key(cls, id))
+            if instance is not None:
+                session.expire(instance, [key])
+
+
+def write_pairs(session, stmt, pairs, chunk_size):
+    post_ids = set()
+    keyword_ids = set()
+    rowcount = 0
+    for chunk in chunked(pairs, chunk_size):
+        for post_id, keyword_id in chunk:
+            post_ids.add(post_id)
+            keyword_ids.add(keyword_id)
+        rowcount += session.execute(
+            stmt,
+            [
+                {"post_id": post_id, "keyword_id": keyword_id}
+                for post_id, keyword_id in chunk
+            ],
+        ).rowcount
+    expire_collections(session, post_ids, keyword_ids)
+    return rowcount
+
+
+def add_keywords(session, pairs, chunk_size=CHUNK_SIZE):
+    """Insert (post_id, keyword_id) pairs, skipping the ones that exist.
+
+    The pairs go straight to post_keywords with executemany, the unit of
+    work never sees them. Returns the number of rows inserted.
+    """
+    return write_pairs(session, insert_pair, pairs, chunk_size)
+
+
+def remove_keywords(session, pairs, chunk_size=CHUNK_SIZE):
+    """Delete (post_id, keyword_id) pairs, ignoring the ones that do not exist."""
+    return write_pairs(session, delete_pair, pairs, chunk_size)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    keywords_per_post = 10
+    posts = count // keywords_per_post
+
+    def setup():
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), id=1, name="wendy")
+            for chunk in chunked(
+                {"id": i, "user_id": 1, "headline": "post %d" % i} for i in range(posts)
+            ):
+                conn.execute(BlogPost.__table__.insert(), chunk)
+            conn.execute(
+                Keyword.__table__.insert(),
+                [{"id": i, "keyword": "tag%d" % i} for i in range(keywords_per_post)],
+            )
+        return sessionmaker(bind=engine)()
+
+    pairs = [(p, k) for p in range(posts) for k in range(keywords_per_post)]
+
+    print("----------------------------------------")
+    print("Associate %d (post, keyword) pairs" % count)
+    print("----------------------------------------")
+    session = setup()
+    start = time.perf_counter()
+    keywords = session.query(Keyword).order_by(Keyword.id).all()
+    for post in session.query(BlogPost):
+        for keyword in keywords:
+            post.keywords.append(keyword)
+    session.commit()
+    print("post.keywords.append: %.3f s" % (time.perf_counter() - start))
+
+    session = setup()
+    start = time.perf_counter()
+    inserted = add_keywords(session, pairs)
+    session.commit()
+    print(
+        "add_keywords():       %.3f s  %d rows"
+        % (time.perf_counter() - start, inserted)
+    )
+    start = time.perf_counter()
+    inserted = add_keywords(session, pairs)
+    session.commit()
+    print(
+        "again (all ignored):  %.3f s  %d rows"
+        % (time.perf_counter() - start, inserted)
+    )
+    start = time.perf_counter()
+    deleted = remove_keywords(session, pairs[::2])
+    session.commit()
+    print(
+        "remove_keywords():    %.3f s  %d rows" % (time.perf_counter() - start, deleted)
+    )
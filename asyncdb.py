@@ -0,0 +1,268 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from bulkload import chunked
+from engines import create_sqlite_engine
+from model.orm import Address, Base, User
+
+
+class AsyncEngine(object):
+    """Run the blocking engine and sessions on worker threads.
+
+    SQLAlchemy 1.3 has no asyncio support of its own, so every call that
+    does I/O is handed to a thread pool with run_in_executor and the event
+    loop only awaits the result. Each AsyncSession/AsyncConnection is used
+    by one coroutine at a time, the pool only runs different ones in parallel.
+
+    Sessions and connections are used with "async with", which waits for a
+    free slot: a session holds its pooled connection until it is closed, and
+    a worker blocked on the pool for a connection held by a coroutine that
+    needs a worker to proceed would deadlock.
+    """
+
+    def __init__(self, url, workers=8, profile="wal", **kwargs):
+        self.engine = create_sqlite_engine(
+            url, profile, pool_size=workers, max_overflow=0, **kwargs
+        )
+        self.executor = ThreadPoolExecutor(workers)
+        self.slots = asyncio.Semaphore(workers)
+        # loaded instances stay readable once the worker has committed
+        self.sessionmaker = sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def connect(self):
+        return AsyncConnection(self)
+
+    def session(self):
+        return AsyncSession(self, self.sessionmaker())
+
+    async def dispose(self):
+        await self.run(self.engine.dispose)
+        self.executor.shutdown()
+
+
+class AsyncConnection(object):
+    def __init__(self, engine):
+        self.engine = engine
+        self.connection = None
+
+    async def execute(self, stmt, *multiparams, **params):
+        """Execute and fetch every row on the worker, returning a list."""
+
+        def execute():
+            result = self.connection.execute(stmt, *multiparams, **params)
+            return result.fetchall() if result.returns_rows else result.rowcount
+
+        return await self.engine.run(execute)
+
+    async def scalar(self, stmt, *multiparams, **params):
+        return await self.engine.run(
+            self.connection.scalar, stmt, *multiparams, **params
+        )
+
+    async def close(self):
+        try:
+            await self.engine.run(self.connection.close)
+        finally:
+            self.engine.slots.release()
+
+    async def __aenter__(self):
+        await self.engine.slots.acquire()
+        try:
+            self.connection = await self.engine.run(self.engine.engine.connect)
+        except BaseException:
+            self.engine.slots.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncSession(object):
+    def __init__(self, engine, session):
+        self.engine = engine
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """Call fn(session, *args, **kwargs) on a worker thread."""
+        return await self.engine.run(fn, self.sync_session, *args, **kwargs)
+
+    async def all(self, query):
+        """Await query(session).all(), query building the Query to run."""
+        return await self.run_sync(lambda session: query(session).all())
+
+    async def get(self, entity, id):
+        return await self.run_sync(lambda session: session.query(entity).get(id))
+
+    async def execute(self, stmt, params=None):
+        return await self.run_sync(
+            lambda session: session.execute(stmt, params).fetchall()
+        )
+
+    async def scalar(self, stmt, params=None):
+        return await self.run_sync(lambda session: session.scalar(stmt, params))
+
+    async def delete(self, instance):
+        await self.run_sync(lambda session: session.delete(instance))
+
+    async def commit(self):
+        await self.engine.run(self.sync_session.commit)
+
+    async def rollback(self):
+        await self.engine.run(self.sync_session.rollback)
+
+    async def close(self):
+        try:
+            await self.engine.run(self.sync_session.close)
+        finally:
+            self.engine.slots.release()
+
+    async def __aenter__(self):
+        await self.engine.slots.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+# the orm.py query patterns
+
+
+async def user_by_name(session, name):
+    return await session.run_sync(
+        lambda session: session.query(User).filter_by(name=name).one()
+    )
+
+
+async def users_by_email(session, email_address):
+    return await session.all(
+        lambda session: session.query(User)
+        .join(Address)
+        .filter(Address.email_address == email_address)
+    )
+
+
+async def user_names_with_addresses(session, pattern=None):
+    criterion = Address.email_address.like(pattern) if pattern is not None else None
+    return await session.all(
+        lambda session: session.query(User.name).filter(User.addresses.any(criterion))
+    )
+
+
+async def users_with_address_counts(session):
+    def query(session):
+        stmt = (
+            session.query(Address.user_id, func.count("*").label("address_count"))
+            .group_by(Address.user_id)
+            .subquery()
+        )
+        return (
+            session.query(User, stmt.c.address_count)
+            .outerjoin(stmt, User.id == stmt.c.user_id)
+            .order_by(User.id)
+        )
+
+    return await session.all(query)
+
+
+async def user_count(session):
+    return await session.scalar(select([func.count(User.id)]))
+
+
+# the core.py query patterns
+
+
+async def users_with_addresses(conn):
+    users = User.__table__
+    addresses = Address.__table__
+    return await conn.execute(
+        select([users, addresses]).where(users.c.id == addresses.c.user_id)
+    )
+
+
+async def address_counts(conn):
+    addresses = Address.__table__
+    return await conn.execute(
+        select([addresses.c.user_id, func.count(addresses.c.id).label("num_addresses")])
+        .group_by(addresses.c.user_id)
+        .order_by(addresses.c.user_id)
+    )
+
+
+async def handler(engine, i):
+    # one simulated request: a lookup, a join and an EXISTS
+    async with engine.session() as session:
+        await user_by_name(session, "user%d" % i)
+        await users_by_email(session, "user%d@example.com" % (i * 2))
+        await user_names_with_addresses(session, "user%d@%%" % i)
+
+
+async def loop_lag(stop):
+    """Longest time the event loop was kept from running this coroutine."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, time.perf_counter() - start - 0.001)
+    return worst
+
+
+async def benchmark(url, workers, requests):
+    engine = AsyncEngine(url, workers)
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(engine, i) for i in range(requests)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await engine.dispose()
+    return seconds, await lag
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    url = "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "asyncdb.sqlite3")
+    engine = create_sqlite_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ):
+            conn.execute(Address.__table__.insert(), chunk)
+    engine.dispose()
+
+    print("----------------------------------------")
+    print("%d concurrent request handlers" % requests)
+    print("----------------------------------------")
+    for workers in (1, 2, 4, 8, 16):
+        seconds, lag = asyncio.run(benchmark(url, workers, requests))
+        print(
+            "%2d workers: %7.0f requests/sec  worst event loop lag: %6.2f ms"
+            % (workers, requests / seconds, lag * 1000)
+        )
@@ -0,0 +1,321 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    func,
+    select,
+)
+
+from aggregates import counters_of, recount
+from bulkload import chunked
+from engines import create_reader_engine, create_sqlite_engine
+from model.tables import metadata, users
+
+CHUNK_SIZE = 10000
+
+# kept outside the application MetaData, like schema_version
+job_metadata = MetaData()
+
+batch_jobs = Table(
+    "batch_jobs",
+    job_metadata,
+    Column("name", String(100), primary_key=True),
+    Column("table_name", String(100), nullable=False),
+    # the primary key range of the job, and how far it got
+    Column("low", Integer, nullable=False),
+    Column("high", Integer, nullable=False),
+    Column("last_id", Integer, nullable=False),
+    Column("chunks", Integer, nullable=False),
+    Column("rows", Integer, nullable=False),
+    Column("started_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("finished_at", DateTime),
+)
+
+
+class BatchJob(object):
+    """Run an UPDATE or DELETE over a table one primary key range at a time.
+
+    Each chunk covers the next chunk_size rows of the table by primary key
+    and is its own transaction, which also moves the job's checkpoint in
+    batch_jobs, so the write lock is held for one chunk only and a job
+    that was interrupted carries on from its last committed chunk when run
+    again under the same name. Rows inserted above the range found when
+    the job started are left alone.
+
+    On addresses and posts, each chunk also rebuilds the counters of the
+    users its rows leave or belong to, see aggregates.py.
+
+    duty is the fraction of the time the job spends writing: after a chunk
+    that took t seconds it sleeps t * (1 - duty) / duty, letting other
+    writers in.
+    """
+
+    def __init__(self, engine, name, stmt, chunk_size=CHUNK_SIZE, duty=0.5):
+        self.engine = engine
+        self.name = name
+        self.stmt = stmt
+        self.table = stmt.table
+        (self.key,) = self.table.primary_key.columns
+        self.chunk_size = chunk_size
+        self.duty = duty
+        self.low = self.high = self.last_id = None
+        self.chunks = self.rows = 0
+        self.finished = False
+        # of this run, a resumed job counts from where it resumed
+        self.seconds = 0.0
+        self.resumed_rows = 0
+
+    def checkpoint(self, conn):
+        return conn.execute(
+            select([batch_jobs]).where(batch_jobs.c.name == self.name)
+        ).first()
+
+    def start(self, conn):
+        batch_jobs.create(conn, checkfirst=True)
+        row = self.checkpoint(conn)
+        if row is not None:
+            self.low, self.high, self.last_id = row.low, row.high, row.last_id
+            self.chunks, self.rows = row.chunks, row.rows
+            self.resumed_rows = row.rows
+            self.finished = row.finished_at is not None
+            return
+        low, high = conn.execute(
+            select([func.min(self.key), func.max(self.key)])
+        ).first()
+        self.low = low if low is not None else 0
+        self.high = high if high is not None else -1
+        self.last_id = self.low - 1
+        now = datetime.utcnow()
+        conn.execute(
+            batch_jobs.insert(),
+            name=self.name,
+            table_name=self.table.name,
+            low=self.low,
+            high=self.high,
+            last_id=self.last_id,
+            chunks=0,
+            rows=0,
+            started_at=now,
+            updated_at=now,
+        )
+
+    def next_bound(self, conn):
+        # the key chunk_size rows on, or the end of the range
+        bound = conn.execute(
+            select([self.key])
+            .where(and_(self.key > self.last_id, self.key <= self.high))
+            .order_by(self.key)
+            .limit(1)
+            .offset(self.chunk_size - 1)
+        ).scalar()
+        return self.high if bound is None else bound
+
+    def owners(self, conn, chunk):
+        return set(
+            user_id
+            for user_id, in conn.execute(
+                select([self.table.c.user_id]).where(chunk).distinct()
+            )
+        )
+
+    def run_chunk(self):
+        with self.engine.begin() as conn:
+            bound = self.next_bound(conn)
+            chunk = and_(self.key > self.last_id, self.key <= bound)
+            counters = counters_of(self.table)
+            if counters:
+                # the users the rows belong to before and after the statement
+                owners = self.owners(conn, chunk)
+            rowcount = conn.execute(self.stmt.where(chunk)).rowcount
+            if counters:
+                owners.update(self.owners(conn, chunk))
+                recount(conn, owners, counters)
+            finished = bound >= self.high
+            now = datetime.utcnow()
+            conn.execute(
+                batch_jobs.update()
+                .where(batch_jobs.c.name == self.name)
+                .values(
+                    last_id=bound,
+                    chunks=batch_jobs.c.chunks + 1,
+                    rows=batch_jobs.c.rows + rowcount,
+                    updated_at=now,
+                    finished_at=now if finished else None,
+                )
+            )
+        self.last_id = bound
+        self.chunks += 1
+        self.rows += rowcount
+        self.finished = finished
+
+    def run(self, progress=None):
+        """Run the chunks left, calling progress(job) after each one."""
+        with self.engine.begin() as conn:
+            self.start(conn)
+        while not self.finished:
+            start = time.perf_counter()
+            self.run_chunk()
+            seconds = time.perf_counter() - start
+            self.seconds += seconds
+            if progress is not None:
+                progress(self)
+            if not self.finished and self.duty < 1:
+                pause = seconds * (1 - self.duty) / self.duty
+                time.sleep(pause)
+                self.seconds += pause
+        return self
+
+    def reset(self):
+        """Forget the checkpoint, the next run() starts over."""
+        with self.engine.begin() as conn:
+            batch_jobs.create(conn, checkfirst=True)
+            conn.execute(batch_jobs.delete().where(batch_jobs.c.name == self.name))
+        self.low = self.high = self.last_id = None
+        self.chunks = self.rows = self.resumed_rows = 0
+        self.seconds = 0.0
+        self.finished = False
+
+    @property
+    def done(self):
+        """Fraction of the primary key range processed."""
+        if self.high is None or self.high < self.low:
+            return 1.0
+        return (self.last_id - self.low + 1) / float(self.high - self.low + 1)
+
+    @property
+    def rows_per_sec(self):
+        rows = self.rows - self.resumed_rows
+        return rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return "<BatchJob(name='%s', %5.1f%%, chunks=%d, rows=%d, %.0f rows/sec)>" % (
+            self.name,
+            self.done * 100,
+            self.chunks,
+            self.rows,
+            self.rows_per_sec,
+        )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+    url = "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "batchjobs.sqlite3")
+    writer = create_sqlite_engine(url, pool_timeout=60)
+    reader = create_reader_engine(url)
+    metadata.create_all(writer)
+
+    def populate():
+        with writer.begin() as conn:
+            conn.execute(users.delete())
+            for chunk in chunked(
+                {"id": i, "name": "name%d" % i, "fullname": "User %d" % i}
+                for i in range(1, count + 1)
+            ):
+                conn.execute(users.insert(), chunk)
+
+    def measure(run):
+        """Run while a reader and a writer thread time their statements."""
+        stop = threading.Event()
+        latencies = {"read": [], "write": []}
+
+        def read():
+            with reader.connect() as conn:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    conn.execute(select([users]).where(users.c.id == 1)).first()
+                    latencies["read"].append(time.perf_counter() - start)
+                    time.sleep(0.001)
+
+        def write():
+            i = count
+            while not stop.is_set():
+                i += 1
+                start = time.perf_counter()
+                with writer.begin() as conn:
+                    conn.execute(users.insert(), id=count * 2 + i, name="new%d" % i)
+                latencies["write"].append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=read), threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(
+            "%.2f s  reads: %d, max %.1f ms  writes: %d, max %.1f ms"
+            % (
+                seconds,
+                len(latencies["read"]),
+                max(latencies["read"] or [0]) * 1000,
+                len(latencies["write"]),
+                max(latencies["write"] or [0]) * 1000,
+            )
+        )
+
+    update = users.update().values(fullname="Fullname: " + users.c.name)
+    delete = users.delete().where(users.c.name.like("name%"))
+
+    for label, stmt in (("UPDATE", update), ("DELETE", delete)):
+        print("----------------------------------------")
+        print("%s %d users while reading and writing" % (label, count))
+        print("----------------------------------------")
+        populate()
+
+        def whole():
+            with writer.begin() as conn:
+                conn.execute(stmt)
+
+        print("one transaction:   ", end="")
+        measure(whole)
+        populate()
+        job = BatchJob(writer, label.lower(), stmt)
+        job.reset()
+        print("chunks, duty 0.5:  ", end="")
+        measure(job.run)
+        print(job)
+
+    print("----------------------------------------")
+    print("Interrupted and resumed")
+    print("----------------------------------------")
+    populate()
+
+    def interrupt(job):
+        print(job)
+        if job.chunks == 3:
+            raise KeyboardInterrupt
+
+    job = BatchJob(writer, "resumed", update, chunk_size=count // 10)
+    job.reset()
+    try:
+        job.run(interrupt)
+    except KeyboardInterrupt:
+        print("interrupted")
+    job = BatchJob(writer, "resumed", update, chunk_size=count // 10)
+    job.run(print)
+    with reader.connect() as conn:
+        print(
+            "users not updated: %d"
+            % conn.execute(
+                select([func.count()])
+                .select_from(users)
+                .where(~users.c.fullname.like("Fullname: %"))
+                .where(users.c.id <= count)
+            ).scalar()
+        )
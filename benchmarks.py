@@ -0,0 +1,886 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import sqlalchemy
+from sqlalchemy import (
+    String,
+    and_,
+    bindparam,
+    cast,
+    create_engine,
+    desc,
+    func,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+    union,
+)
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import exists
+
+from bulkload import chunked
+from model.orm import Address, Base, BlogPost, Keyword, User, post_keywords
+
+users = User.__table__
+addresses = Address.__table__
+
+DOMAINS = ("aol.com", "msn.com", "yahoo.com", "google.com")
+
+# name -> function(context) running one operation of the pattern
+benchmarks = OrderedDict()
+
+
+def benchmark(name):
+    def register(fn):
+        benchmarks[name] = fn
+        return fn
+
+    return register
+
+
+def populate(engine, count):
+    """count users, 2 addresses and 1 post each, 100 keywords, 3 per post."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {
+                "id": i,
+                "name": "user%d" % i,
+                "fullname": "User %d" % i,
+                "nickname": "u%d" % i,
+                "address_count": 2,
+                "post_count": 1,
+            }
+            for i in range(1, count + 1)
+        ):
+            conn.execute(users.insert(), chunk)
+        for chunk in chunked(
+            {
+                "user_id": i // 2 + 1,
+                "email_address": "user%d@%s" % (i // 2 + 1, DOMAINS[i % 4]),
+            }
+            for i in range(count * 2)
+        ):
+            conn.execute(addresses.insert(), chunk)
+        for chunk in chunked(
+            {"id": i, "user_id": i, "headline": "post %d" % i, "body": "body %d" % i}
+            for i in range(1, count + 1)
+        ):
+            conn.execute(BlogPost.__table__.insert(), chunk)
+        conn.execute(
+            Keyword.__table__.insert(),
+            [{"id": i, "keyword": "keyword%d" % i} for i in range(1, 101)],
+        )
+        for chunk in chunked(
+            {"post_id": i, "keyword_id": (i + k) % 100 + 1}
+            for i in range(1, count + 1)
+            for k in range(3)
+        ):
+            conn.execute(post_keywords.insert(), chunk)
+
+
+class Context(object):
+    """What a benchmark runs against: one connection, one session, the size."""
+
+    def __init__(self, conn, session, users):
+        self.conn = conn
+        self.session = session
+        self.users = users
+        self.calls = 0
+
+    def user_id(self):
+        # walk the users so lookups do not all hit the same cached pages
+        self.calls += 1
+        return self.calls * 7919 % self.users + 1
+
+    def name(self):
+        return "user%d" % self.user_id()
+
+
+# core.py patterns
+
+
+@benchmark("core.insert.values")
+def _(ctx):
+    ctx.conn.execute(users.insert().values(name="jack", fullname="Jack Jones"))
+
+
+@benchmark("core.insert.kwargs")
+def _(ctx):
+    ctx.conn.execute(users.insert(), name="wendy", fullname="Wendy Williams")
+
+
+@benchmark("core.insert.executemany")
+def _(ctx):
+    user_id = ctx.user_id()
+    ctx.conn.execute(
+        addresses.insert(),
+        [
+            {"user_id": user_id, "email_address": "jack@yahoo.com"},
+            {"user_id": user_id, "email_address": "jack@msn.com"},
+            {"user_id": user_id, "email_address": "www@www.org"},
+            {"user_id": user_id, "email_address": "wendy@aol.com"},
+        ],
+    )
+
+
+@benchmark("core.select.all")
+def _(ctx):
+    for row in ctx.conn.execute(select([users])):
+        pass
+
+
+@benchmark("core.select.fetchone_by_name")
+def _(ctx):
+    row = ctx.conn.execute(select([users])).fetchone()
+    row["name"], row["fullname"]
+
+
+@benchmark("core.select.fetchone_by_index")
+def _(ctx):
+    row = ctx.conn.execute(select([users])).fetchone()
+    row[1], row[2]
+
+
+@benchmark("core.select.by_column_object")
+def _(ctx):
+    for row in ctx.conn.execute(select([users])):
+        row[users.c.name], row[users.c.fullname]
+
+
+@benchmark("core.select.columns")
+def _(ctx):
+    ctx.conn.execute(select([users.c.name, users.c.fullname])).fetchall()
+
+
+@benchmark("core.select.where_join")
+def _(ctx):
+    ctx.conn.execute(
+        select([users, addresses]).where(users.c.id == addresses.c.user_id)
+    ).fetchall()
+
+
+def title_select():
+    return select(
+        [(users.c.fullname + ", " + addresses.c.email_address).label("title")]
+    )
+
+
+@benchmark("core.select.and_or")
+def _(ctx):
+    ctx.conn.execute(
+        title_select().where(
+            and_(
+                users.c.id == addresses.c.user_id,
+                users.c.name.between("m", "z"),
+                or_(
+                    addresses.c.email_address.like("%@aol.com"),
+                    addresses.c.email_address.like("%@msn.com"),
+                ),
+            )
+        )
+    ).fetchall()
+
+
+@benchmark("core.select.multiple_where")
+def _(ctx):
+    ctx.conn.execute(
+        title_select()
+        .where(users.c.id == addresses.c.user_id)
+        .where(users.c.name.between("m", "z"))
+        .where(
+            or_(
+                addresses.c.email_address.like("%@aol.com"),
+                addresses.c.email_address.like("%@msn.com"),
+            )
+        )
+    ).fetchall()
+
+
+@benchmark("core.text.select")
+def _(ctx):
+    ctx.conn.execute(
+        text(
+            "SELECT users.fullname || ', ' || addresses.email_address AS title "
+            "FROM users, addresses "
+            "WHERE users.id = addresses.user_id "
+            "AND users.name BETWEEN :x AND :y "
+            "AND (addresses.email_address LIKE :e1 "
+            "OR addresses.email_address LIKE :e2)"
+        ),
+        x="m",
+        y="z",
+        e1="%@aol.com",
+        e2="%@msn.com",
+    ).fetchall()
+
+
+@benchmark("core.text.bindparams")
+def _(ctx):
+    stmt = text("SELECT * FROM users WHERE users.name BETWEEN :x AND :y")
+    ctx.conn.execute(stmt.bindparams(x="m", y="n")).fetchall()
+
+
+@benchmark("core.text.typed_bindparams")
+def _(ctx):
+    stmt = text("SELECT * FROM users WHERE users.name BETWEEN :x AND :y")
+    stmt = stmt.bindparams(bindparam("x", type_=String), bindparam("y", type_=String))
+    ctx.conn.execute(stmt, {"x": "m", "y": "n"}).fetchall()
+
+
+@benchmark("core.text.columns")
+def _(ctx):
+    stmt = text(
+        "SELECT users.id, addresses.id, users.id, "
+        "users.name, addresses.email_address AS email "
+        "FROM users JOIN addresses ON users.id=addresses.user_id "
+        "WHERE users.id = :id"
+    ).columns(
+        users.c.id,
+        addresses.c.id,
+        addresses.c.user_id,
+        users.c.name,
+        addresses.c.email_address,
+    )
+    row = ctx.conn.execute(stmt, id=ctx.user_id()).fetchone()
+    row[addresses.c.email_address]
+
+
+@benchmark("core.text.fragments")
+def _(ctx):
+    s = (
+        select([text("users.fullname || ', ' || addresses.email_address AS title")])
+        .where(
+            and_(
+                text("users.id = addresses.user_id"),
+                text("users.name BETWEEN 'm' AND 'z'"),
+                text(
+                    "(addresses.email_address LIKE :x "
+                    "OR addresses.email_address LIKE :y)"
+                ),
+            )
+        )
+        .select_from(text("users, addresses"))
+    )
+    ctx.conn.execute(s, x="%@aol.com", y="%@msn.com").fetchall()
+
+
+@benchmark("core.text.literal_column")
+def _(ctx):
+    s = (
+        select(
+            [
+                literal_column("users.fullname", String)
+                + ", "
+                + literal_column("addresses.email_address").label("title")
+            ]
+        )
+        .where(
+            and_(
+                literal_column("users.id") == literal_column("addresses.user_id"),
+                text("users.name BETWEEN 'm' AND 'z'"),
+                text(
+                    "(addresses.email_address LIKE :x OR "
+                    "addresses.email_address LIKE :y)"
+                ),
+            )
+        )
+        .select_from(table("users"))
+        .select_from(table("addresses"))
+    )
+    ctx.conn.execute(s, x="%@aol.com", y="%@msn.com").fetchall()
+
+
+@benchmark("core.group_by")
+def _(ctx):
+    ctx.conn.execute(
+        select([addresses.c.user_id, func.count(addresses.c.id).label("num_addresses")])
+        .group_by("user_id")
+        .order_by("user_id", desc("num_addresses"))
+    ).fetchall()
+
+
+@benchmark("core.alias")
+def _(ctx):
+    a1 = addresses.alias()
+    a2 = addresses.alias()
+    user_id = ctx.user_id()
+    ctx.conn.execute(
+        select([users]).where(
+            and_(
+                users.c.id == a1.c.user_id,
+                users.c.id == a2.c.user_id,
+                a1.c.email_address == "user%d@aol.com" % user_id,
+                a2.c.email_address == "user%d@msn.com" % user_id,
+            )
+        )
+    ).fetchall()
+
+
+@benchmark("core.join.like")
+def _(ctx):
+    # the LIKE join is a nested scan, a window of users keeps it linear in size
+    user_id = ctx.user_id()
+    ctx.conn.execute(
+        select([users.c.fullname])
+        .select_from(
+            users.join(addresses, addresses.c.email_address.like(users.c.name + "%"))
+        )
+        .where(users.c.id.between(user_id, user_id + 9))
+    ).fetchall()
+
+
+@benchmark("core.join.outer_bindparam")
+def _(ctx):
+    s = (
+        select([users, addresses])
+        .where(
+            or_(
+                users.c.name.like(bindparam("name", type_=String) + text("'%'")),
+                addresses.c.email_address.like(
+                    bindparam("name", type_=String) + text("'@%'")
+                ),
+            )
+        )
+        .select_from(users.outerjoin(addresses))
+        .order_by(addresses.c.id)
+    )
+    ctx.conn.execute(s, name=ctx.name()).fetchall()
+
+
+@benchmark("core.func.max")
+def _(ctx):
+    ctx.conn.execute(
+        select([func.max(addresses.c.email_address, type_=String).label("maxemail")])
+    ).scalar()
+
+
+@benchmark("core.cast")
+def _(ctx):
+    ctx.conn.execute(select([cast(users.c.id, String)])).fetchall()
+
+
+@benchmark("core.union")
+def _(ctx):
+    u = union(
+        addresses.select().where(addresses.c.email_address == "foo@bar.com"),
+        addresses.select().where(addresses.c.email_address.like("%@yahoo.com")),
+    ).order_by(addresses.c.email_address)
+    ctx.conn.execute(u).fetchall()
+
+
+@benchmark("core.update.all")
+def _(ctx):
+    ctx.conn.execute(users.update().values(fullname="Fullname: " + users.c.name))
+
+
+@benchmark("core.insert.bindparam_many")
+def _(ctx):
+    ctx.conn.execute(
+        users.insert().values(name=bindparam("_name") + " .. name"),
+        [{"_name": "name1"}, {"_name": "name2"}, {"_name": "name3"}],
+    )
+
+
+@benchmark("core.update.where")
+def _(ctx):
+    ctx.conn.execute(users.update().where(users.c.name == ctx.name()).values(name="ed"))
+
+
+@benchmark("core.update.bindparam_many")
+def _(ctx):
+    ctx.conn.execute(
+        users.update()
+        .where(users.c.name == bindparam("oldname"))
+        .values(name=bindparam("newname")),
+        [
+            {"oldname": ctx.name(), "newname": "ed"},
+            {"oldname": ctx.name(), "newname": "mary"},
+            {"oldname": ctx.name(), "newname": "jake"},
+        ],
+    )
+
+
+@benchmark("core.delete.like")
+def _(ctx):
+    ctx.conn.execute(users.delete().where(users.c.name.like("user1%")))
+
+
+# orm.py patterns
+
+
+@benchmark("orm.add")
+def _(ctx):
+    ctx.session.add(User(name="ed", fullname="Ed Jones", nickname="edsnickname"))
+    ctx.session.commit()
+
+
+@benchmark("orm.add_all")
+def _(ctx):
+    ctx.session.add_all(
+        [
+            User(name="wendy", fullname="Wendy Williams", nickname="windy"),
+            User(name="mary", fullname="Mary Contrary", nickname="mary"),
+            User(name="fred", fullname="Fred Flintstone", nickname="freddy"),
+        ]
+    )
+    ctx.session.commit()
+
+
+@benchmark("orm.rollback")
+def _(ctx):
+    user = ctx.session.query(User).get(ctx.user_id())
+    user.name = "Edwardo"
+    ctx.session.add(User(name="fakeuser", fullname="Invalid", nickname="12345"))
+    ctx.session.flush()
+    ctx.session.rollback()
+
+
+@benchmark("orm.query.order_by")
+def _(ctx):
+    for instance in ctx.session.query(User).order_by(User.id):
+        instance.name, instance.fullname
+
+
+@benchmark("orm.query.columns")
+def _(ctx):
+    for name, fullname in ctx.session.query(User.name, User.fullname):
+        pass
+
+
+@benchmark("orm.query.tuples")
+def _(ctx):
+    for row in ctx.session.query(User, User.name).all():
+        row.User, row.name
+
+
+@benchmark("orm.query.label")
+def _(ctx):
+    for row in ctx.session.query(User.name.label("name_label")).all():
+        row.name_label
+
+
+@benchmark("orm.query.alias")
+def _(ctx):
+    user_alias = aliased(User, name="user_alias")
+    for row in ctx.session.query(user_alias, user_alias.name).all():
+        row.user_alias
+
+
+@benchmark("orm.query.slice")
+def _(ctx):
+    ctx.session.query(User).order_by(User.id)[1:3]
+
+
+@benchmark("orm.query.filter_by")
+def _(ctx):
+    ctx.session.query(User.name).filter_by(fullname="User %d" % ctx.user_id()).all()
+
+
+@benchmark("orm.query.filters")
+def _(ctx):
+    user_id = ctx.user_id()
+    ctx.session.query(User).filter(User.name == "user%d" % user_id).filter(
+        User.fullname == "User %d" % user_id
+    ).all()
+
+
+@benchmark("orm.operator.like")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.like("%ed%")).all()
+
+
+@benchmark("orm.operator.ilike")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.ilike("%ed%")).all()
+
+
+@benchmark("orm.operator.in")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.in_([ctx.name(), ctx.name()])).all()
+
+
+@benchmark("orm.operator.not_in")
+def _(ctx):
+    ctx.session.query(User.id).filter(~User.name.in_(["ed", "wendy", "jack"])).all()
+
+
+@benchmark("orm.operator.is_null")
+def _(ctx):
+    ctx.session.query(User).filter(User.name == None).all()  # noqa: E711
+
+
+@benchmark("orm.operator.and")
+def _(ctx):
+    user_id = ctx.user_id()
+    ctx.session.query(User).filter(
+        and_(User.name == "user%d" % user_id, User.fullname == "User %d" % user_id)
+    ).all()
+
+
+@benchmark("orm.operator.or")
+def _(ctx):
+    ctx.session.query(User).filter(
+        or_(User.name == ctx.name(), User.name == ctx.name())
+    ).all()
+
+
+@benchmark("orm.query.all")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.like("%ed")).order_by(User.id).all()
+
+
+@benchmark("orm.query.first")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.like("%1")).order_by(User.id).first()
+
+
+@benchmark("orm.query.one")
+def _(ctx):
+    ctx.session.query(User).filter(User.name == ctx.name()).limit(1).one()
+
+
+@benchmark("orm.query.scalar")
+def _(ctx):
+    ctx.session.query(User.id).filter(User.name == ctx.name()).order_by(
+        User.id
+    ).scalar()
+
+
+@benchmark("orm.text.filter")
+def _(ctx):
+    ctx.session.query(User).filter(text("id<224")).order_by(text("id")).all()
+
+
+@benchmark("orm.text.params")
+def _(ctx):
+    user_id = ctx.user_id()
+    ctx.session.query(User).filter(text("id<:value and name=:name")).params(
+        value=user_id + 1, name="user%d" % user_id
+    ).order_by(User.id).one()
+
+
+@benchmark("orm.text.from_statement")
+def _(ctx):
+    ctx.session.query(User).from_statement(
+        text("SELECT * FROM users where name=:name")
+    ).params(name=ctx.name()).all()
+
+
+@benchmark("orm.text.from_statement_columns")
+def _(ctx):
+    stmt = text("SELECT name, id, fullname, nickname FROM users where name=:name")
+    stmt = stmt.columns(User.name, User.id, User.fullname, User.nickname)
+    ctx.session.query(User).from_statement(stmt).params(name=ctx.name()).all()
+
+
+@benchmark("orm.count.query")
+def _(ctx):
+    ctx.session.query(User).filter(User.name.like("%ed")).count()
+
+
+@benchmark("orm.count.func")
+def _(ctx):
+    ctx.session.query(func.count(User.id)).scalar()
+
+
+@benchmark("orm.count.group_by")
+def _(ctx):
+    ctx.session.query(func.count(User.name), User.name).group_by(User.name).all()
+
+
+@benchmark("orm.add.with_addresses")
+def _(ctx):
+    jack = User(name="jack", fullname="Jack Bean", nickname="gjffdd")
+    jack.addresses = [
+        Address(email_address="jack@google.com"),
+        Address(email_address="j25@yahoo.com"),
+    ]
+    ctx.session.add(jack)
+    ctx.session.commit()
+
+
+@benchmark("orm.relationship.lazy_addresses")
+def _(ctx):
+    ctx.session.query(User).filter_by(name=ctx.name()).one().addresses
+
+
+@benchmark("orm.query.two_entities")
+def _(ctx):
+    user_id = ctx.user_id()
+    ctx.session.query(User, Address).filter(User.id == Address.user_id).filter(
+        Address.email_address == "user%d@aol.com" % user_id
+    ).all()
+
+
+@benchmark("orm.join.relationship")
+def _(ctx):
+    ctx.session.query(User).join(Address).filter(
+        Address.email_address == "user%d@aol.com" % ctx.user_id()
+    ).all()
+
+
+@benchmark("orm.join.explicit")
+def _(ctx):
+    ctx.session.query(User).join(Address, User.id == Address.user_id).filter(
+        User.id == ctx.user_id()
+    ).all()
+
+
+@benchmark("orm.join.aliases")
+def _(ctx):
+    adalias1 = aliased(Address)
+    adalias2 = aliased(Address)
+    user_id = ctx.user_id()
+    ctx.session.query(User.name, adalias1.email_address, adalias2.email_address).join(
+        adalias1, User.addresses
+    ).join(adalias2, User.addresses).filter(
+        adalias1.email_address == "user%d@aol.com" % user_id
+    ).filter(
+        adalias2.email_address == "user%d@msn.com" % user_id
+    ).all()
+
+
+@benchmark("orm.subquery.counts")
+def _(ctx):
+    stmt = (
+        ctx.session.query(Address.user_id, func.count("*").label("address_count"))
+        .group_by(Address.user_id)
+        .subquery()
+    )
+    ctx.session.query(User, stmt.c.address_count).outerjoin(
+        stmt, User.id == stmt.c.user_id
+    ).order_by(User.id).all()
+
+
+@benchmark("orm.subquery.select_from")
+def _(ctx):
+    stmt = (
+        ctx.session.query(Address)
+        .filter(Address.email_address != "j25@yahoo.com")
+        .subquery()
+    )
+    adalias = aliased(Address, stmt)
+    ctx.session.query(User, adalias).join(adalias, User.addresses).all()
+
+
+@benchmark("orm.exists")
+def _(ctx):
+    stmt = exists().where(Address.user_id == User.id)
+    ctx.session.query(User.name).filter(stmt).all()
+
+
+@benchmark("orm.any")
+def _(ctx):
+    ctx.session.query(User.name).filter(User.addresses.any()).all()
+
+
+@benchmark("orm.any.like")
+def _(ctx):
+    ctx.session.query(User.name).filter(
+        User.addresses.any(Address.email_address.like("%google%"))
+    ).all()
+
+
+@benchmark("orm.relationship.eq")
+def _(ctx):
+    ctx.session.query(Address).filter(Address.user == User(id=ctx.user_id())).all()
+
+
+@benchmark("orm.relationship.ne")
+def _(ctx):
+    ctx.session.query(Address.id).filter(Address.user != User(id=ctx.user_id())).all()
+
+
+@benchmark("orm.relationship.is_none")
+def _(ctx):
+    ctx.session.query(Address).filter(Address.user == None).all()  # noqa: E711
+
+
+@benchmark("orm.relationship.has")
+def _(ctx):
+    ctx.session.query(Address).filter(Address.user.has(name=ctx.name())).all()
+
+
+@benchmark("orm.relationship.with_parent")
+def _(ctx):
+    ctx.session.query(Address).with_parent(User(id=ctx.user_id()), "addresses").all()
+
+
+@benchmark("orm.delete.cascade")
+def _(ctx):
+    jack = ctx.session.query(User).filter_by(name=ctx.name()).one()
+    ctx.session.delete(jack)
+    ctx.session.commit()
+
+
+@benchmark("orm.add.post")
+def _(ctx):
+    wendy = ctx.session.query(User).get(ctx.user_id())
+    ctx.session.add(BlogPost("Wendy's Blog Post", "This is a test", wendy))
+    ctx.session.commit()
+
+
+@benchmark("orm.add.keywords")
+def _(ctx):
+    post = ctx.session.query(BlogPost).get(ctx.user_id())
+    post.keywords.append(Keyword("wendy"))
+    post.keywords.append(Keyword("firstpost"))
+    ctx.session.commit()
+
+
+@benchmark("orm.many_to_many.any")
+def _(ctx):
+    ctx.session.query(BlogPost).filter(
+        BlogPost.keywords.any(keyword="keyword%d" % (ctx.user_id() % 100 + 1))
+    ).limit(100).all()
+
+
+@benchmark("orm.many_to_many.author_and_any")
+def _(ctx):
+    wendy = ctx.session.query(User).get(ctx.user_id())
+    ctx.session.query(BlogPost).filter(BlogPost.author == wendy).filter(
+        BlogPost.keywords.any(keyword="keyword1")
+    ).all()
+
+
+@benchmark("orm.dynamic.filter")
+def _(ctx):
+    wendy = ctx.session.query(User).get(ctx.user_id())
+    wendy.posts.filter(BlogPost.keywords.any(keyword="keyword1")).all()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_once(conn, users, fn):
+    # every run starts from the same data: its writes are rolled back
+    transaction = conn.begin()
+    session = Session(bind=conn)
+    try:
+        start = time.perf_counter()
+        fn(Context(conn, session, users))
+        return time.perf_counter() - start
+    finally:
+        session.close()
+        transaction.rollback()
+
+
+def run(engine, users, names, warmup=3, repeat=20):
+    results = OrderedDict()
+    conn = engine.connect()
+    for name in names:
+        fn = benchmarks[name]
+        for i in range(warmup):
+            run_once(conn, users, fn)
+        timings = [run_once(conn, users, fn) for i in range(repeat)]
+        tracemalloc.start()
+        run_once(conn, users, fn)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        median = percentile(timings, 0.5)
+        results[name] = {
+            "runs": repeat,
+            "median_ms": median * 1000,
+            "p95_ms": percentile(timings, 0.95) * 1000,
+            "ops_per_sec": 1.0 / median if median else None,
+            "peak_memory_kb": peak / 1024.0,
+        }
+    conn.close()
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Names whose median got slower than the baseline by more than threshold."""
+    regressions = OrderedDict()
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and before["median_ms"]:
+            ratio = result["median_ms"] / before["median_ms"]
+            if ratio > 1 + threshold:
+                regressions[name] = ratio
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark every core.py and orm.py pattern."
+    )
+    parser.add_argument("--users", type=int, default=1000, help="dataset size")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--filter", default="", help="only names containing this")
+    parser.add_argument("--database", help="SQLite file, a temporary one by default")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [name for name in benchmarks if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    path = args.database or os.path.join(tempfile.mkdtemp(), "benchmarks.sqlite3")
+    engine = create_engine("sqlite:///%s" % path)
+    start = time.perf_counter()
+    populate(engine, args.users)
+    print("populated %d users in %.1f s" % (args.users, time.perf_counter() - start))
+
+    print("----------------------------------------")
+    print("%d benchmarks, %d runs each" % (len(names), args.repeat))
+    print("----------------------------------------")
+    results = run(engine, args.users, names, args.warmup, args.repeat)
+    for name, result in results.items():
+        print(
+            "%-40s median %9.3f ms  p95 %9.3f ms  %9.0f ops/s  peak %8.1f KB"
+            % (
+                name,
+                result["median_ms"],
+                result["p95_ms"],
+                result["ops_per_sec"] or 0,
+                result["peak_memory_kb"],
+            )
+        )
+
+    report = {
+        "meta": {
+            "users": args.users,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "sqlite": engine.dialect.dbapi.sqlite_version,
+            "time": time.time(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions.items():
+            print("REGRESSION %-40s %.2fx slower" % (name, ratio))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
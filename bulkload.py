@@ -0,0 +1,145 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from sqlalchemy import create_engine, select
+
+from model.tables import addresses, metadata, users
+
+CHUNK_SIZE = 10000
+# stay well under SQLite's limit on bound parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+class LoadReport(object):
+    def __init__(self, table, rows, chunks, seconds):
+        self.table = table
+        self.rows = rows
+        self.chunks = chunks
+        self.seconds = seconds
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return "<LoadReport(table='%s', rows=%d, chunks=%d, %.3fs, %.0f rows/sec)>" % (
+            self.table,
+            self.rows,
+            self.chunks,
+            self.seconds,
+            self.rows_per_sec,
+        )
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def user_ids(conn):
+    """Map users.name to users.id, read in a single SELECT."""
+    return {name: id for id, name in conn.execute(select([users.c.id, users.c.name]))}
+
+
+def load(conn, table, rows, chunk_size=CHUNK_SIZE, prepare=None):
+    """Insert rows into table, one executemany per chunk, in one transaction."""
+    ins = table.insert()
+    count = chunks = 0
+    start = time.perf_counter()
+    with conn.begin():
+        for chunk in chunked(rows, chunk_size):
+            if prepare is not None:
+                chunk = [prepare(row) for row in chunk]
+            conn.execute(ins, chunk)
+            count += len(chunk)
+            chunks += 1
+    return LoadReport(table.name, count, chunks, time.perf_counter() - start)
+
+
+def load_users(conn, rows, chunk_size=CHUNK_SIZE):
+    return load(conn, users, rows, chunk_size)
+
+
+def load_addresses(conn, rows, chunk_size=CHUNK_SIZE, ids=None):
+    """Load addresses whose rows give the owner by "name" instead of "user_id".
+
+    The address_count of their users is rebuilt, where users has one.
+    """
+    if ids is None:
+        ids = user_ids(conn)
+
+    # imported here, aggregates needs chunked() from this module
+    from aggregates import counters_of, recount
+
+    owners = set()
+
+    def prepare(row):
+        if "user_id" not in row:
+            try:
+                user_id = ids[row["name"]]
+            except KeyError:
+                raise ValueError("unknown user name %r" % row["name"])
+            row = {"user_id": user_id, "email_address": row["email_address"]}
+        owners.add(row["user_id"])
+        return row
+
+    with conn.begin():
+        report = load(conn, addresses, rows, chunk_size, prepare)
+        recount(conn, owners, counters_of(addresses))
+    return report
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    engine = create_engine("sqlite:///bulkload.sqlite3")
+    metadata.drop_all(engine, checkfirst=True)
+    metadata.create_all(engine, checkfirst=True)
+    conn = engine.connect()
+
+    print("----------------------------------------")
+    print("Load users")
+    print("----------------------------------------")
+    print(
+        load_users(
+            conn,
+            (
+                {"name": "user%d" % i, "fullname": "User %d" % i}
+                for i in range(count)
+            ),
+        )
+    )
+
+    print("----------------------------------------")
+    print("Load addresses (user_id from users.name)")
+    print("----------------------------------------")
+    print(
+        load_addresses(
+            conn,
+            (
+                {"name": "user%d" % (i // 2), "email_address": "user%d@example.com" % i}
+                for i in range(count * 2)
+            ),
+        )
+    )
@@ -0,0 +1,277 @@
+import sys
+import time
+from itertools import chain
+
+from sqlalchemy import (
+    Column,
+    MetaData,
+    Table,
+    and_,
+    bindparam,
+    create_engine,
+    exists,
+    func,
+    select,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from aggregates import counters_of, recount
+from bulkload import CHUNK_SIZE, chunked
+from model.orm import Base, User
+
+# UPDATE ... FROM appeared in SQLite 3.33.0
+UPDATE_FROM_VERSION = (3, 33, 0)
+
+
+class UpdateReport(object):
+    def __init__(self, table, rows, updated, counts, seconds):
+        self.table = table
+        self.rows = rows
+        self.updated = updated
+        # key -> number of rows it matched
+        self.counts = counts
+        self.seconds = seconds
+
+    @property
+    def missing(self):
+        return [key for key, count in self.counts.items() if not count]
+
+    def __repr__(self):
+        return "<UpdateReport(table='%s', keys=%d, updated=%d, missing=%d, %.3fs)>" % (
+            self.table,
+            self.rows,
+            self.updated,
+            len(self.missing),
+            self.seconds,
+        )
+
+
+def staging_table(table, keys, columns):
+    """A temporary table holding the key columns k0.. and the values v_<name>."""
+    return Table(
+        "bulk_update_%s" % table.name,
+        MetaData(),
+        *[
+            Column("k%d" % i, table.c[key].type, primary_key=True)
+            for i, key in enumerate(keys)
+        ]
+        + [Column("v_%s" % column, table.c[column].type) for column in columns],
+        prefixes=["TEMPORARY"]
+    )
+
+
+def apply_update_from(conn, table, staged, keys, columns):
+    # SQLAlchemy 1.3 cannot compile UPDATE ... FROM for SQLite, spell it out
+    quote = conn.dialect.identifier_preparer.quote
+    return conn.execute(
+        "UPDATE %s SET %s FROM %s WHERE %s"
+        % (
+            quote(table.name),
+            ", ".join(
+                "%s = %s.%s" % (quote(column), staged.name, quote("v_%s" % column))
+                for column in columns
+            ),
+            staged.name,
+            " AND ".join(
+                "%s.%s = %s.k%d" % (quote(table.name), quote(key), staged.name, i)
+                for i, key in enumerate(keys)
+            ),
+        )
+    ).rowcount
+
+
+def apply_correlated(conn, table, staged, keys, columns):
+    match = and_(*(staged.c["k%d" % i] == table.c[key] for i, key in enumerate(keys)))
+    return conn.execute(
+        table.update()
+        .values(
+            {
+                column: select([staged.c["v_%s" % column]]).where(match).as_scalar()
+                for column in columns
+            }
+        )
+        .where(exists().where(match))
+    ).rowcount
+
+
+def bulk_update(conn, table, key, rows, chunk_size=CHUNK_SIZE, update_from=None):
+    """Apply (key, {column: value}) pairs to the rows of table matching key.
+
+    key names the column (or a tuple of columns) rows are matched on, it
+    may be one of the updated columns. The pairs are staged in a temporary
+    table with executemany, then applied by one UPDATE ... FROM, or by an
+    UPDATE with correlated subqueries on SQLite before 3.33 (or when
+    update_from is False). Every key is matched against the table as it
+    was before the update; when a key is given more than once, its last
+    pair wins.
+
+    table may be a mapped class and conn a Session, the updated attributes
+    of the instances it holds are then expired. Moving addresses or posts
+    to other users rebuilds the counters of both, see aggregates.py.
+    """
+    start = time.perf_counter()
+    session = None
+    if isinstance(conn, Session):
+        session = conn
+        conn = session.connection()
+    entity = None
+    if not isinstance(table, Table):
+        entity = table
+        table = entity.__table__
+    keys = (key,) if isinstance(key, str) else tuple(key)
+
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return UpdateReport(table.name, 0, 0, {}, time.perf_counter() - start)
+    columns = sorted(first[1])
+    staged = staging_table(table, keys, columns)
+
+    def staged_row(pair):
+        key_values, values = pair
+        if len(keys) == 1:
+            key_values = (key_values,)
+        row = {"k%d" % i: value for i, value in enumerate(key_values)}
+        row.update(("v_%s" % column, values[column]) for column in columns)
+        return row
+
+    if update_from is None:
+        update_from = conn.dialect.dbapi.sqlite_version_info >= UPDATE_FROM_VERSION
+    with conn.begin():
+        staged.drop(conn, checkfirst=True)
+        staged.create(conn)
+        count = 0
+        # the last pair of a key replaces the others
+        ins = staged.insert().prefix_with("OR REPLACE")
+        for chunk in chunked(chain([first], rows), chunk_size):
+            conn.execute(ins, [staged_row(pair) for pair in chunk])
+            count += len(chunk)
+
+        # counted before the update, which may change the key columns
+        match = and_(
+            *(staged.c["k%d" % i] == table.c[key] for i, key in enumerate(keys))
+        )
+        key_columns = [staged.c["k%d" % i] for i in range(len(keys))]
+        counts = {}
+        for row in conn.execute(
+            select(key_columns + [func.count(table.c[keys[0]])])
+            .select_from(staged.outerjoin(table, match))
+            .group_by(*key_columns)
+        ):
+            counts[row[0] if len(keys) == 1 else tuple(row[:-1])] = row[-1]
+
+        # the users whose counters the rows leave or join, as for a flush
+        owners = set()
+        counters = counters_of(table) if "user_id" in columns else []
+        if counters:
+            owners.update(
+                user_id
+                for user_id, in conn.execute(
+                    select([table.c.user_id])
+                    .select_from(staged.join(table, match))
+                    .distinct()
+                )
+            )
+            owners.update(
+                user_id
+                for user_id, in conn.execute(select([staged.c.v_user_id]).distinct())
+            )
+
+        if update_from:
+            updated = apply_update_from(conn, table, staged, keys, columns)
+        else:
+            updated = apply_correlated(conn, table, staged, keys, columns)
+        staged.drop(conn)
+        counters = recount(conn, owners, counters)
+
+    if session is not None and entity is not None:
+        expire(session, entity, keys, columns, counts)
+    if session is not None and counters:
+        for user_id in owners:
+            user = session.identity_map.get(identity_key(User, user_id))
+            if user is not None:
+                session.expire(user, counters)
+    return UpdateReport(table.name, count, updated, counts, time.perf_counter() - start)
+
+
+def expire(session, entity, keys, columns, counts):
+    mapper = entity.__mapper__
+    table = entity.__table__
+    key_attrs = [mapper.get_property_by_column(table.c[key]).key for key in keys]
+    attrs = [mapper.get_property_by_column(table.c[column]).key for column in columns]
+    for instance in list(session.identity_map.values()):
+        if not isinstance(instance, entity):
+            continue
+        # an unloaded key attribute may be one of ours, expire to be safe
+        values = tuple(instance.__dict__.get(attr) for attr in key_attrs)
+        key = values[0] if len(keys) == 1 else values
+        if None in values or key in counts:
+            session.expire(instance, attrs)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    def setup():
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for chunk in chunked(
+                {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+                for i in range(count)
+            ):
+                conn.execute(User.__table__.insert(), chunk)
+        return engine
+
+    users = User.__table__
+    renames = [("user%d" % (i * 7 % count), "renamed%d" % i) for i in range(updates)]
+
+    print("----------------------------------------")
+    print("Rename %d of %d users by name (no index)" % (updates, count))
+    print("----------------------------------------")
+    engine = setup()
+    with engine.begin() as conn:
+        stmt = (
+            users.update()
+            .where(users.c.name == bindparam("oldname"))
+            .values(name=bindparam("newname"))
+        )
+        start = time.perf_counter()
+        conn.execute(stmt, [{"oldname": old, "newname": new} for old, new in renames])
+        print("executemany:        %.3f s" % (time.perf_counter() - start))
+
+    for label, form in (("UPDATE ... FROM", True), ("correlated UPDATE", False)):
+        engine = setup()
+        with engine.connect() as conn:
+            report = bulk_update(
+                conn,
+                users,
+                "name",
+                ((old, {"name": new}) for old, new in renames),
+                update_from=form,
+            )
+        print("%-19s %.3f s  %r" % (label + ":", report.seconds, report))
+
+    print("----------------------------------------")
+    print("ORM instances are expired")
+    print("----------------------------------------")
+    engine = setup()
+    session = Session(bind=engine)
+    user = session.query(User).get(1)
+    print(user)
+    print(
+        bulk_update(
+            session,
+            User,
+            "id",
+            [
+                (1, {"fullname": "Ed Jones", "nickname": "ed"}),
+                (-1, {"fullname": "Nobody", "nickname": ""}),
+            ],
+        )
+    )
+    print(user)
+    session.commit()
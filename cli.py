@@ -0,0 +1,40 @@
+import argparse
+import importlib
+import sys
+
+
+def bootstrap():
+    """Create or upgrade the schema of the model.session database."""
+    from model.orm import Base
+    from model.session import get_engine
+    from schema import bootstrap
+
+    applied = bootstrap(get_engine(), Base.metadata)
+    print("schema %s" % ("upgraded" if applied else "up to date"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the tutorial workloads.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    commands.add_parser("core", help="the Core walkthrough, on core.sqlite3")
+    commands.add_parser(
+        "orm", help="the ORM walkthrough, on $DATABASE_URL or orm.sqlite3"
+    )
+    commands.add_parser("bootstrap", help="create or upgrade the ORM schema")
+    importtime = commands.add_parser(
+        "importtime", help="import time of the model package and scripts"
+    )
+    importtime.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "bootstrap":
+        return bootstrap()
+    if args.command == "importtime":
+        return importlib.import_module("importtime").main(args.repeat)
+    # the workloads are only imported when their command is chosen
+    return importlib.import_module(args.command).main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict
+
+from sqlalchemy import (
+    Boolean,
+    Float,
+    Integer,
+    Numeric,
+    String,
+    create_engine,
+    select,
+    text,
+)
+from sqlalchemy.orm import Query, Session
+
+from bulkload import chunked
+from model.orm import Address, Base, User
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = 10000
+
+
+def require(module, name):
+    if module is None:
+        raise ImportError("%s is not installed" % name)
+    return module
+
+
+def kind(type_):
+    """What a Column type holds: "int", "float", "bool", "string" or "object"."""
+    if isinstance(type_, Boolean):
+        return "bool"
+    if isinstance(type_, Integer):
+        return "int"
+    if isinstance(type_, (Float, Numeric)):
+        return "float"
+    if isinstance(type_, String):
+        # Text, Unicode and Enum too
+        return "string"
+    # DateTime, untyped text() columns and the like
+    return "object"
+
+
+def chunks(conn, stmt, chunk_size=CHUNK_SIZE, **params):
+    """Yield (names, kinds) then one tuple of values per column for each chunk.
+
+    The rows are read straight from the DBAPI cursor, so no Row object is
+    built; stmt is a Core select or an ORM Query, conn a Connection or a
+    Session.
+    """
+    if isinstance(stmt, Query):
+        params = dict(stmt._params, **params)
+        stmt = stmt.statement
+    if isinstance(conn, Session):
+        conn = conn.connection()
+    result = conn.execution_options(stream_results=True).execute(stmt, **params)
+    try:
+        names = result.keys()
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate column names in %s, label them" % names)
+        # textual SQL has no Column types to go by
+        columns = getattr(stmt, "inner_columns", None)
+        if columns is None:
+            kinds = ["object"] * len(names)
+        else:
+            kinds = [kind(column.type) for column in columns]
+        yield names, kinds
+        cursor = result.cursor
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield list(zip(*rows))
+    finally:
+        result.close()
+
+
+def python_column(values, kind):
+    # typecodes "q" and "d" hold 8 bytes a value instead of a Python object
+    if kind in ("int", "float") and None not in values:
+        return array("q" if kind == "int" else "d", values)
+    return list(values)
+
+
+def to_columns(conn, stmt, chunk_size=CHUNK_SIZE, **params):
+    """name -> array/list of the column values, without NumPy or Arrow."""
+    batches = chunks(conn, stmt, chunk_size, **params)
+    names, kinds = next(batches)
+    columns = OrderedDict((name, None) for name in names)
+    for batch in batches:
+        for name, kind_, values in zip(names, kinds, batch):
+            column = columns[name]
+            if column is None:
+                columns[name] = python_column(values, kind_)
+                continue
+            if isinstance(column, array) and None in values:
+                column = columns[name] = list(column)
+            column.extend(values)
+    for name, column in columns.items():
+        if column is None:
+            columns[name] = []
+    return columns
+
+
+def numpy_column(values, kind):
+    if kind == "int":
+        if None in values:
+            # NumPy integers have no NULL, use NaN as pandas does
+            return numpy.array(values, dtype=numpy.float64)
+        return numpy.array(values, dtype=numpy.int64)
+    if kind == "float":
+        return numpy.array(values, dtype=numpy.float64)
+    if kind == "bool" and None not in values:
+        return numpy.array(values, dtype=numpy.bool_)
+    return numpy.array(values, dtype=object)
+
+
+def to_numpy(conn, stmt, chunk_size=CHUNK_SIZE, **params):
+    """name -> NumPy array of the column values, typed from the Column types."""
+    require(numpy, "numpy")
+    batches = chunks(conn, stmt, chunk_size, **params)
+    names, kinds = next(batches)
+    parts = OrderedDict((name, []) for name in names)
+    for batch in batches:
+        for name, kind_, values in zip(names, kinds, batch):
+            parts[name].append(numpy_column(values, kind_))
+    columns = OrderedDict()
+    for name, kind_ in zip(names, kinds):
+        if parts[name]:
+            columns[name] = numpy.concatenate(parts[name])
+        else:
+            columns[name] = numpy_column((), kind_)
+    return columns
+
+
+def arrow_schema(names, kinds, sample=None):
+    """The Arrow schema of chunks(); "object" columns take the type Arrow
+    infers from their values in sample, a chunk, null without one."""
+    types = {
+        "int": pyarrow.int64(),
+        "float": pyarrow.float64(),
+        "bool": pyarrow.bool_(),
+        "string": pyarrow.string(),
+    }
+    fields = []
+    for i, (name, kind_) in enumerate(zip(names, kinds)):
+        type_ = types.get(kind_)
+        if type_ is None:
+            if sample is None:
+                type_ = pyarrow.null()
+            else:
+                # null too when the chunk only holds NULLs
+                type_ = pyarrow.array(sample[i]).type
+        fields.append((name, type_))
+    return pyarrow.schema(fields)
+
+
+def record_batches(conn, stmt, chunk_size=CHUNK_SIZE, **params):
+    """Yield the schema, then one Arrow RecordBatch per chunk of rows.
+
+    String and Text columns become Arrow strings, NULLs become Arrow nulls.
+    Columns of other types, text() ones included, are null in the schema
+    and get the type Arrow infers from each chunk in its batch, which stays
+    null while they only hold NULLs; to_arrow() unifies them.
+    """
+    require(pyarrow, "pyarrow")
+    batches = chunks(conn, stmt, chunk_size, **params)
+    names, kinds = next(batches)
+    yield arrow_schema(names, kinds)
+    for batch in batches:
+        schema = arrow_schema(names, kinds, batch)
+        yield pyarrow.RecordBatch.from_arrays(
+            [
+                pyarrow.array(values, type=field.type)
+                for field, values in zip(schema, batch)
+            ],
+            schema=schema,
+        )
+
+
+def to_arrow(conn, stmt, chunk_size=CHUNK_SIZE, **params):
+    """An Arrow Table of the whole result.
+
+    The batches are cast to one schema, a column that is NULL in some
+    chunks takes the type of the others.
+    """
+    batches = record_batches(conn, stmt, chunk_size, **params)
+    schema = next(batches)
+    tables = [pyarrow.Table.from_batches([batch]) for batch in batches]
+    schema = pyarrow.unify_schemas([schema] + [table.schema for table in tables])
+    if not tables:
+        return schema.empty_table()
+    return pyarrow.concat_tables([table.cast(schema) for table in tables])
+
+
+if __name__ == "__main__":
+    from sqlalchemy.orm import sessionmaker
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ):
+            conn.execute(Address.__table__.insert(), chunk)
+
+    users = User.__table__
+    addresses = Address.__table__
+    stmt = select(
+        [
+            users.c.id,
+            users.c.name,
+            addresses.c.id.label("address_id"),
+            addresses.c.email_address,
+        ]
+    ).where(users.c.id == addresses.c.user_id)
+
+    def fetchall(conn, stmt):
+        rows = conn.execute(stmt).fetchall()
+        names = rows[0].keys() if rows else []
+        return OrderedDict(
+            (name, [row[i] for row in rows]) for i, name in enumerate(names)
+        )
+
+    def measure(label, export, source, conn):
+        start = time.perf_counter()
+        columns = export(conn, source)
+        seconds = time.perf_counter() - start
+        del columns
+        # tracing slows allocations down, measure memory in a second run
+        tracemalloc.start()
+        columns = export(conn, source)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if isinstance(columns, dict):
+            rows = len(next(iter(columns.values())))
+        else:
+            rows = columns.num_rows
+        print(
+            "%-28s %8d rows %8.3f s  peak %8.1f MB"
+            % (label, rows, seconds, peak / 1024.0 / 1024)
+        )
+
+    exports = [("fetchall() + list comp", fetchall), ("to_columns()", to_columns)]
+    if numpy is not None:
+        exports.append(("to_numpy()", to_numpy))
+    if pyarrow is not None:
+        exports.append(("to_arrow()", to_arrow))
+
+    print("----------------------------------------")
+    print("Export users joined to addresses (%d rows)" % (count * 2))
+    print("----------------------------------------")
+    conn = engine.connect()
+    for label, export in exports:
+        measure(label, export, stmt, conn)
+    conn.close()
+    for missing, module in (("numpy", numpy), ("pyarrow", pyarrow)):
+        if module is None:
+            print("%s is not installed, skipped" % missing)
+
+    print("----------------------------------------")
+    print("Export an ORM query (%d rows)" % count)
+    print("----------------------------------------")
+    session = sessionmaker(bind=engine)()
+    query = session.query(User.id, User.name, User.fullname)
+    for label, export in exports[1:]:
+        measure(label, export, query, session)
+    session.close()
+
+    if pyarrow is not None:
+        print("----------------------------------------")
+        print("Untyped column NULL in the first chunk")
+        print("----------------------------------------")
+        untyped = text(
+            "SELECT CASE WHEN id > 10 THEN id END AS x FROM users ORDER BY id"
+        )
+        with engine.connect() as conn:
+            table = to_arrow(conn, untyped, chunk_size=10)
+        x = table.column("x")
+        assert x.type == pyarrow.int64(), x.type
+        assert x.null_count == 11 and x[11].as_py() == 11
+        print("x: %s, %d NULLs of %d rows" % (x.type, x.null_count, len(x)))
@@ -0,0 +1,135 @@
+import sys
+import time
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    create_engine,
+    inspect,
+    select,
+)
+from sqlalchemy.orm import sessionmaker
+
+from bulkload import chunked
+from loading import QueryCounter
+from model.orm import Address, Base, BlogPost, Keyword, User, post_keywords
+
+
+def delete_users(session, *criterion):
+    """Delete the users matching criterion with their addresses and posts.
+
+    The ids of the users are copied into a temporary table by one
+    INSERT ... SELECT, then each table gets one DELETE ... WHERE ... IN
+    (SELECT id ...) from it, children first, so the number of statements
+    does not depend on how many rows go, and a criterion on the children
+    still holds for the users once these are gone.
+    This bypasses the ORM cascades: deleted instances are expunged from the
+    session and Keyword.posts collections are expired instead.
+    Returns the number of users deleted. At least one criterion is required,
+    use truncate() from schema.py to empty the tables.
+    """
+    if not criterion:
+        raise ValueError("delete_users() needs a criterion")
+    users = User.__table__
+    posts = BlogPost.__table__
+    addresses = Address.__table__
+    conn = session.connection()
+    doomed = Table(
+        "delete_users",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        prefixes=["TEMPORARY"],
+    )
+    doomed.drop(conn, checkfirst=True)
+    doomed.create(conn)
+    conn.execute(
+        doomed.insert().from_select(
+            ["id"], select([users.c.id]).where(and_(*criterion))
+        )
+    )
+    user_ids = select([doomed.c.id])
+    post_ids = select([posts.c.id]).where(posts.c.user_id.in_(user_ids))
+
+    # the ids are only needed to find what the identity map holds
+    deleted = set(id for id, in conn.execute(user_ids))
+    conn.execute(post_keywords.delete().where(post_keywords.c.post_id.in_(post_ids)))
+    conn.execute(posts.delete().where(posts.c.user_id.in_(user_ids)))
+    conn.execute(addresses.delete().where(addresses.c.user_id.in_(user_ids)))
+    rowcount = conn.execute(users.delete().where(users.c.id.in_(user_ids))).rowcount
+    doomed.drop(conn)
+
+    # expired instances must not be refreshed, their rows may be gone
+    for instance in list(session.identity_map.values()):
+        state = inspect(instance)
+        if isinstance(instance, User):
+            gone = state.identity[0] in deleted
+        elif isinstance(instance, (Address, BlogPost)):
+            user_id = state.dict.get("user_id")
+            # unloaded: it may have been one of them, drop it to be safe
+            gone = user_id is None or user_id in deleted
+        elif isinstance(instance, Keyword):
+            session.expire(instance, ["posts"])
+            continue
+        else:
+            continue
+        if gone:
+            session.expunge(instance)
+    return rowcount
+
+
+def populate(conn, count):
+    for chunk in chunked(
+        {"id": i, "name": "user%d" % i, "fullname": "User %d" % i} for i in range(count)
+    ):
+        conn.execute(User.__table__.insert(), chunk)
+    for chunk in chunked(
+        {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+        for i in range(count * 2)
+    ):
+        conn.execute(Address.__table__.insert(), chunk)
+    for chunk in chunked(
+        {"id": i, "user_id": i, "headline": "post %d" % i} for i in range(count)
+    ):
+        conn.execute(BlogPost.__table__.insert(), chunk)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # the per-object path takes minutes beyond this
+    orm_count = min(count, 10000)
+
+    def setup(count):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            populate(conn, count)
+        return engine, sessionmaker(bind=engine)()
+
+    print("----------------------------------------")
+    print("Delete users with their addresses and posts")
+    print("----------------------------------------")
+    engine, session = setup(orm_count)
+    start = time.perf_counter()
+    with QueryCounter(engine) as counter:
+        for user in session.query(User):
+            for post in user.posts:
+                session.delete(post)
+            session.delete(user)
+        session.commit()
+    print(
+        "session.delete(): %7d statements  %.3f s  %d users"
+        % (counter.count, time.perf_counter() - start, orm_count)
+    )
+
+    engine, session = setup(count)
+    start = time.perf_counter()
+    with QueryCounter(engine) as counter:
+        deleted = delete_users(session, User.name.like("user%"))
+        session.commit()
+    print(
+        "delete_users():   %7d statements  %.3f s  %d users"
+        % (counter.count, time.perf_counter() - start, deleted)
+    )
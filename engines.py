@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from model.tables import metadata, users
+
+# pragma values per profile, applied in this order on every new connection
+PRAGMAS = ("busy_timeout", "journal_mode", "synchronous", "cache_size",
+           "mmap_size", "temp_store")
+
+PROFILES = {
+    # SQLite defaults: rollback journal, full fsync on every commit
+    "default": {},
+    # WAL only needs to fsync on checkpoints with synchronous=NORMAL
+    "wal": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    # bulk loads that can be redone: no fsync at all
+    "bulk": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def apply_profile(engine, profile, readonly=False):
+    pragmas = PROFILES[profile]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name in PRAGMAS:
+            # the journal mode is stored in the file, readers cannot set it
+            if name in pragmas and not (readonly and name == "journal_mode"):
+                cursor.execute("PRAGMA %s = %s" % (name, pragmas[name]))
+        if readonly:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    return engine
+
+
+def create_sqlite_engine(url, profile="wal", **kwargs):
+    """Writer engine: a single pooled connection, SQLite has one writer anyway."""
+    kwargs.setdefault("poolclass", QueuePool)
+    kwargs.setdefault("pool_size", 1)
+    kwargs.setdefault("max_overflow", 0)
+    kwargs.setdefault("connect_args", {"check_same_thread": False})
+    return apply_profile(create_engine(url, **kwargs), profile)
+
+
+def create_reader_engine(url, profile="wal", pool_size=5, **kwargs):
+    """Reader engine: its own pool of read-only connections to the same file."""
+    path = make_url(url).database
+    if path in (None, "", ":memory:"):
+        # every connection would open a new, empty database
+        raise ValueError("reader engines need a database file, not %s" % url)
+    kwargs.setdefault("poolclass", QueuePool)
+    kwargs.setdefault("pool_size", pool_size)
+    kwargs.setdefault("max_overflow", 0)
+    kwargs.setdefault("connect_args", {"check_same_thread": False})
+    engine = create_engine(
+        "sqlite:///file:%s?mode=ro&uri=true" % quote(path), **kwargs
+    )
+    return apply_profile(engine, profile, readonly=True)
+
+
+def create_engines(url, profile="wal", **kwargs):
+    return (
+        create_sqlite_engine(url, profile, **kwargs),
+        create_reader_engine(url, profile, **kwargs),
+    )
+
+
+def run_workload(engine, count):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    conn = engine.connect()
+    start = time.perf_counter()
+    # one autocommitted statement at a time, as in core.py
+    for i in range(count):
+        conn.execute(users.insert().values(name="user%d" % i, fullname="User %d" % i))
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(count):
+        conn.execute(
+            users.update()
+            .where(users.c.id == i + 1)
+            .values(fullname="Fullname: " + users.c.name)
+        )
+    updated = time.perf_counter() - start
+    conn.close()
+    return inserted, updated
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    directory = tempfile.mkdtemp()
+
+    print("----------------------------------------")
+    print("Insert/update one statement per commit (%d rows)" % count)
+    print("----------------------------------------")
+    for profile in PROFILES:
+        url = "sqlite:///%s" % os.path.join(directory, "%s.sqlite3" % profile)
+        writer, reader = create_engines(url, profile)
+        inserted, updated = run_workload(writer, count)
+        print(
+            "%-8s insert: %8.0f rows/sec  update: %8.0f rows/sec  readers see %d users"
+            % (
+                profile,
+                count / inserted,
+                count / updated,
+                reader.execute(select([func.count()]).select_from(users)).scalar(),
+            )
+        )
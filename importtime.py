@@ -0,0 +1,85 @@
+import os
+import statistics
+import subprocess
+import sys
+from collections import OrderedDict
+
+# module -> import time budget in milliseconds, SQLAlchemy itself is most of it
+BUDGETS = OrderedDict(
+    [
+        ("model", 10),
+        ("model.tables", 200),
+        ("model.orm", 250),
+        ("model.session", 250),
+        ("core", 250),
+        ("orm", 300),
+    ]
+)
+
+MARKER = "-- importtime --"
+
+
+def importtime(module, python=sys.executable):
+    """(self us, cumulative us, name, depth) of each import done by module.
+
+    Runs "python -X importtime" in a fresh interpreter; what the interpreter
+    imports at startup is left out.
+    """
+    code = "import sys; sys.stderr.write(%r); import %s" % (MARKER + "\n", module)
+    process = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
+    lines = process.stderr.split(MARKER + "\n", 1)[1].splitlines()
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # the header line
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return imports
+
+
+def total_ms(imports):
+    return sum(cumulative for _, cumulative, _, depth in imports if depth == 0) / 1000.0
+
+
+def measure(module, repeat=5, python=sys.executable):
+    """Median import time of module in milliseconds, and the last run's imports."""
+    runs = [importtime(module, python) for i in range(repeat)]
+    return statistics.median(total_ms(imports) for imports in runs), runs[-1]
+
+
+def main(repeat=5):
+    """Print the import times against BUDGETS, 1 when one is over budget."""
+    print("----------------------------------------")
+    print("Import time, median of %d fresh interpreters" % repeat)
+    print("----------------------------------------")
+    over = []
+    slowest = {}
+    for module, budget in BUDGETS.items():
+        ms, imports = measure(module, repeat)
+        status = "ok" if ms <= budget else "OVER BUDGET"
+        if ms > budget:
+            over.append(module)
+        print("%-14s %8.1f ms  budget %5d ms  %s" % (module, ms, budget, status))
+        for self_us, _, name, _ in imports:
+            slowest[name] = max(slowest.get(name, 0), self_us)
+
+    print("----------------------------------------")
+    print("Slowest modules (self time)")
+    print("----------------------------------------")
+    for name, self_us in sorted(slowest.items(), key=lambda item: -item[1])[:10]:
+        print("%-40s %8.1f ms" % (name, self_us / 1000.0))
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
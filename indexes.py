@@ -0,0 +1,251 @@
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, create_engine, inspect, select
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.expression import Alias, BinaryExpression, ColumnClause
+
+from model.orm import Address, Base, BlogPost, Keyword, User, post_keywords
+
+# the statements orm.py issues against foreign keys, by name
+queries = OrderedDict()
+
+
+def query(name):
+    def register(builder):
+        queries[name] = builder
+        return builder
+
+    return register
+
+
+@query("user.addresses")
+def user_addresses():
+    # lazy load of jack.addresses, also run by the delete-orphan cascade
+    return select([Address.__table__]).where(Address.user_id == bindparam("user_id"))
+
+
+@query("user.posts")
+def user_posts():
+    # lazy="dynamic" wendy.posts
+    return select([BlogPost.__table__]).where(BlogPost.user_id == bindparam("user_id"))
+
+
+@query("keyword.posts")
+def keyword_posts():
+    return select([post_keywords]).where(
+        post_keywords.c.keyword_id == bindparam("keyword_id")
+    )
+
+
+@query("users.join(addresses)")
+def users_join_addresses():
+    return (
+        select([User.__table__])
+        .select_from(User.__table__.join(Address.__table__))
+        .where(User.name == bindparam("name"))
+    )
+
+
+@query("User.addresses.any()")
+def users_with_addresses():
+    return select([User.name]).where(User.addresses.any())
+
+
+@query("BlogPost.keywords.any()")
+def posts_with_keyword():
+    return select([BlogPost.__table__]).where(
+        BlogPost.keywords.any(Keyword.keyword == bindparam("keyword"))
+    )
+
+
+def compile_sql(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.construct_params(_check=False)
+    return str(compiled), [params[name] for name in compiled.positiontup]
+
+
+def explain(conn, stmt):
+    """Return the EXPLAIN QUERY PLAN detail lines of a statement."""
+    sql, params = compile_sql(conn, stmt)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def table_names(stmt):
+    """Map the names a plan may mention (tables and aliases) to table names."""
+    names = {}
+    for element in visitors.iterate(stmt, {}):
+        if isinstance(element, Alias) and hasattr(element.original, "name"):
+            names[element.name] = getattr(element.original, "name", element.name)
+        elif getattr(element, "__visit_name__", None) == "table":
+            names[element.name] = element.name
+    return names
+
+
+def equality_columns(stmt):
+    """Columns compared with "=" anywhere in the statement, subqueries included."""
+    columns = set()
+    for element in visitors.iterate(stmt, {}):
+        if isinstance(element, BinaryExpression) and element.operator is operators.eq:
+            for side in (element.left, element.right):
+                if isinstance(side, ColumnClause) and side.table is not None:
+                    table = getattr(side.table, "original", side.table)
+                    columns.add((table.name, side.name))
+    return columns
+
+
+def indexed_columns(conn, table):
+    inspector = inspect(conn)
+    # the first column of an index or primary key can serve an "=" lookup
+    columns = {
+        index["column_names"][0]
+        for index in inspector.get_indexes(table)
+        if index["column_names"]
+    }
+    pk = inspector.get_pk_constraint(table)["constrained_columns"]
+    if pk:
+        columns.add(pk[0])
+    return columns
+
+
+def full_scans(plan, names):
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        # before SQLite 3.36 the plan says "SCAN TABLE t"
+        if words[1:2] == ["TABLE"]:
+            del words[1]
+        # "SCAN t USING COVERING INDEX" reads an index, not the table
+        if words[0] == "SCAN" and "INDEX" not in words:
+            scans.append(names.get(words[1], words[1]))
+    return scans
+
+
+def advise(conn):
+    """Explain every registered query and propose indexes for its full scans.
+
+    Returns a list of (query name, plan, scanned tables, proposed indexes),
+    each proposed index being an (index name, table, column) tuple named like
+    the ones index=True declares.
+    """
+    report = []
+    for name, builder in queries.items():
+        stmt = builder()
+        plan = explain(conn, stmt)
+        scans = full_scans(plan, table_names(stmt))
+        proposed = []
+        for table, column in sorted(equality_columns(stmt)):
+            if table in scans and column not in indexed_columns(conn, table):
+                proposed.append(("ix_%s_%s" % (table, column), table, column))
+        report.append((name, plan, scans, proposed))
+    return report
+
+
+def create_indexes(conn, report):
+    quote = conn.dialect.identifier_preparer.quote
+    created = []
+    for name, plan, scans, proposed in report:
+        for index, table, column in proposed:
+            if index not in created:
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS %s ON %s (%s)"
+                    % (quote(index), quote(table), quote(column))
+                )
+                created.append(index)
+    return created
+
+
+def latency(conn, stmt, params, number=100):
+    start = time.perf_counter()
+    for i in range(number):
+        conn.execute(stmt, params).fetchall()
+    return (time.perf_counter() - start) / number
+
+
+def populate(conn, count):
+    conn.execute(
+        User.__table__.insert(),
+        [
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ],
+    )
+    conn.execute(
+        Address.__table__.insert(),
+        [
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ],
+    )
+    conn.execute(
+        BlogPost.__table__.insert(),
+        [
+            {"id": i, "user_id": i // 2, "headline": "post %d" % i}
+            for i in range(count * 2)
+        ],
+    )
+    conn.execute(
+        Keyword.__table__.insert(),
+        [{"id": i, "keyword": "keyword%d" % i} for i in range(100)],
+    )
+    conn.execute(
+        post_keywords.insert(),
+        [{"post_id": i, "keyword_id": i % 100} for i in range(count * 2)],
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    params = {
+        "user_id": count // 2,
+        "keyword_id": 7,
+        "name": "user7",
+        "keyword": "keyword7",
+    }
+
+    engine = create_engine(
+        "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "indexes.sqlite3")
+    )
+    conn = engine.connect()
+    # a database created before the indexes were declared on the models
+    for table in Base.metadata.sorted_tables:
+        conn.execute(CreateTable(table))
+    populate(conn, count)
+
+    print("----------------------------------------")
+    print("Query plans")
+    print("----------------------------------------")
+    report = advise(conn)
+    before = {}
+    for name, plan, scans, proposed in report:
+        before[name] = latency(conn, queries[name](), params)
+        print(name)
+        for detail in plan:
+            print("    " + detail)
+        for index, table, column in proposed:
+            print("    proposed: %s on %s (%s)" % (index, table, column))
+
+    print("----------------------------------------")
+    print("Create missing indexes")
+    print("----------------------------------------")
+    for index in create_indexes(conn, report):
+        print(index)
+
+    print("----------------------------------------")
+    print("Latency before/after")
+    print("----------------------------------------")
+    for name, plan, scans, proposed in advise(conn):
+        after = latency(conn, queries[name](), params)
+        print(
+            "%-24s %9.3f ms -> %9.3f ms  scans: %s"
+            % (name, before[name] * 1000, after * 1000, ", ".join(scans) or "-")
+        )
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from sqlalchemy import create_engine, event, select
+
+from model.tables import metadata, users
+
+log = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+SPACES = re.compile(r"\s+")
+
+
+# compiled statements repeat the same text, normalize each one once
+@lru_cache(maxsize=4096)
+def normalize(sql):
+    """Collapse whitespace, literals and IN lists so similar SQL shares a key."""
+    sql = LITERALS.sub("?", sql)
+    sql = IN_LISTS.sub("(?)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+class CountingCursor(object):
+    """DBAPI cursor proxy counting the rows the result fetches."""
+
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows_returned += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.stats.rows_returned += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.rows_returned += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.stats.rows_returned += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class StatementStats(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * len(BUCKETS)
+        self.rows_returned = 0
+        self.rows_affected = 0
+
+    def record(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        ms = seconds * 1000
+        for i, bound in enumerate(BUCKETS):
+            if ms <= bound:
+                self.histogram[i] += 1
+                break
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total_ms": self.seconds * 1000,
+            "mean_ms": self.seconds * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max_seconds * 1000,
+            "histogram": {
+                ("<=%gms" % bound if bound != float("inf") else "inf"): count
+                for bound, count in zip(BUCKETS, self.histogram)
+            },
+            "rows_returned": self.rows_returned,
+            "rows_affected": self.rows_affected,
+        }
+
+
+class Instrumentation(object):
+    """Per-statement latency, row counts and a slow-query log for an engine.
+
+    The listeners are only attached while enabled, so a disabled
+    instrumentation adds nothing to the execute path.
+    """
+
+    def __init__(self, engine, slow_threshold=0.1, slow_log_size=100):
+        self.engine = engine
+        self.slow_threshold = slow_threshold
+        self.stats = {}
+        self.slow = deque(maxlen=slow_log_size)
+        self.lock = threading.Lock()
+        self.enabled = False
+
+    def enable(self):
+        if not self.enabled:
+            event.listen(
+                self.engine, "before_cursor_execute", self.before_cursor_execute
+            )
+            event.listen(self.engine, "after_cursor_execute", self.after_cursor_execute)
+            self.enabled = True
+        return self
+
+    def disable(self):
+        if self.enabled:
+            event.remove(
+                self.engine, "before_cursor_execute", self.before_cursor_execute
+            )
+            event.remove(self.engine, "after_cursor_execute", self.after_cursor_execute)
+            self.enabled = False
+        return self
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        seconds = time.perf_counter() - conn.info["query_start_time"].pop()
+        key = normalize(statement)
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = StatementStats()
+            stats.record(seconds)
+            if cursor.description is None:
+                stats.rows_affected += max(cursor.rowcount, 0)
+        if cursor.description is not None and context is not None:
+            # the result reads its rows from context.cursor
+            context.cursor = CountingCursor(cursor, stats)
+        if seconds >= self.slow_threshold:
+            entry = {
+                "sql": statement,
+                "parameters": repr(parameters)[:200],
+                "ms": seconds * 1000,
+                "at": time.time(),
+            }
+            self.slow.append(entry)
+            log.warning("slow query (%.1f ms): %s", entry["ms"], statement)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "statements": {
+                    key: stats.snapshot() for key, stats in self.stats.items()
+                },
+                "slow": list(self.slow),
+            }
+
+    def dump(self, file, **kwargs):
+        json.dump(self.snapshot(), file, indent=2, **kwargs)
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.slow.clear()
+
+
+def instrument(engine, **kwargs):
+    return Instrumentation(engine, **kwargs).enable()
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    def workload(engine):
+        conn = engine.connect()
+        start = time.perf_counter()
+        for i in range(number):
+            conn.execute(select([users]).where(users.c.id == i % 100)).fetchall()
+        conn.close()
+        return (time.perf_counter() - start) / number
+
+    print("----------------------------------------")
+    print("Cost per execute (%d selects)" % number)
+    print("----------------------------------------")
+    for label, echo, enabled in (
+        ("echo=True", True, None),
+        ("no instrumentation", False, None),
+        ("instrumentation off", False, False),
+        ("instrumentation on", False, True),
+    ):
+        engine = create_engine("sqlite://", echo=echo)
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("sqlalchemy"):
+                for handler in logging.getLogger(name).handlers:
+                    # pay for formatting and writing the echo, without the noise
+                    handler.setStream(open(os.devnull, "w"))
+        metadata.create_all(engine)
+        engine.execute(
+            users.insert(), [{"id": i, "name": "user%d" % i} for i in range(100)]
+        )
+        if enabled is not None:
+            instrumentation = Instrumentation(engine)
+            if enabled:
+                instrumentation.enable()
+        print("%-20s %6.1f us" % (label, workload(engine) * 1e6))
+    instrumentation.dump(sys.stdout)
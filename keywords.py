@@ -0,0 +1,261 @@
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, event, inspect, select
+from sqlalchemy.orm import Session, object_session, sessionmaker
+
+from bulkload import IN_CHUNK_SIZE, chunked
+from loading import QueryCounter
+from model.orm import Base, BlogPost, Keyword, User, post_keywords
+
+
+class KeywordCache(object):
+    """LRU from keyword string to keywords.id, one per engine.
+
+    Ids resolved inside a transaction are only shared once it commits, so a
+    rollback can never leave the cache pointing at a row that does not exist.
+    Keywords the ORM deletes or renames are dropped when their transaction
+    commits; after deleting or updating keywords with Core statements, call
+    cache_for(engine).clear(), SQLite may give a deleted id to the next new
+    keyword.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, keyword):
+        with self.lock:
+            try:
+                id = self.ids[keyword]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.ids.move_to_end(keyword)
+            self.hits += 1
+            return id
+
+    def update(self, ids):
+        with self.lock:
+            self.ids.update(ids)
+            for keyword in ids:
+                self.ids.move_to_end(keyword)
+            while len(self.ids) > self.maxsize:
+                self.ids.popitem(last=False)
+
+    def discard(self, keyword):
+        with self.lock:
+            self.ids.pop(keyword, None)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.ids),
+            "maxsize": self.maxsize,
+        }
+
+
+# engine -> its KeywordCache, the ids of one database mean nothing in another
+caches = weakref.WeakKeyDictionary()
+caches_lock = threading.Lock()
+
+
+def cache_for(engine):
+    with caches_lock:
+        cache = caches.get(engine)
+        if cache is None:
+            cache = caches[engine] = KeywordCache()
+        return cache
+
+
+def session_cache(session):
+    # get_bind() may return a Connection
+    return cache_for(session.get_bind(Keyword).engine)
+
+
+def pending(session):
+    return session.info.setdefault("keyword_ids", {})
+
+
+def stale(session):
+    # keywords whose cached id this session's transaction made wrong, None
+    # when an unloaded keyword was renamed and any of them may be
+    return session.info.setdefault("keyword_stale", set())
+
+
+def keyword_changed(session, keywords):
+    if session is None:
+        return
+    changed = stale(session)
+    for keyword in keywords:
+        pending(session).pop(keyword, None)
+        changed.add(keyword)
+
+
+@event.listens_for(Keyword, "after_delete")
+def keyword_deleted(mapper, connection, target):
+    history = inspect(target).attrs.keyword.history
+    old = history.deleted or history.unchanged or [None]
+    keyword_changed(object_session(target), old)
+
+
+@event.listens_for(Keyword, "after_update")
+def keyword_renamed(mapper, connection, target):
+    history = inspect(target).attrs.keyword.history
+    if history.added:
+        old = history.deleted or [None]
+        keyword_changed(object_session(target), list(history.added) + list(old))
+
+
+@event.listens_for(Session, "after_commit")
+def share_keyword_ids(session):
+    changed = session.info.pop("keyword_stale", None)
+    ids = session.info.pop("keyword_ids", None)
+    if not changed and not ids:
+        return
+    cache = session_cache(session)
+    if changed:
+        if None in changed:
+            cache.clear()
+        for keyword in changed:
+            cache.discard(keyword)
+    if ids:
+        cache.update(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_keyword_ids(session):
+    session.info.pop("keyword_ids", None)
+    session.info.pop("keyword_stale", None)
+
+
+def select_ids(session, keywords):
+    keywords_table = Keyword.__table__
+    ids = {}
+    for chunk in chunked(keywords, IN_CHUNK_SIZE):
+        ids.update(
+            (keyword, id)
+            for id, keyword in session.execute(
+                select([keywords_table.c.id, keywords_table.c.keyword]).where(
+                    keywords_table.c.keyword.in_(chunk)
+                )
+            )
+        )
+    return ids
+
+
+def keyword_ids(session, keywords):
+    """Map every keyword to its id, creating the missing ones.
+
+    Misses are read with one IN query and the rest inserted with one
+    executemany of INSERT OR IGNORE, so a keyword created meanwhile by
+    another session is picked up instead of raising IntegrityError.
+    """
+    ids = {}
+    missing = []
+    session_ids = pending(session)
+    changed = session.info.get("keyword_stale", ())
+    cache = session_cache(session)
+    for keyword in set(keywords):
+        id = session_ids.get(keyword)
+        if id is None and keyword not in changed and None not in changed:
+            id = cache.get(keyword)
+        if id is None:
+            missing.append(keyword)
+        else:
+            ids[keyword] = id
+    if missing:
+        found = select_ids(session, missing)
+        created = [keyword for keyword in missing if keyword not in found]
+        if created:
+            session.execute(
+                Keyword.__table__.insert().prefix_with("OR IGNORE"),
+                [{"keyword": keyword} for keyword in created],
+            )
+            found.update(select_ids(session, created))
+        session_ids.update(found)
+        ids.update(found)
+    return ids
+
+
+def get_or_create(session, keyword):
+    return session.query(Keyword).get(keyword_ids(session, [keyword])[keyword])
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    vocabulary = ["tag%d" % i for i in range(2000)]
+    random.seed(0)
+    tags = [(i, random.sample(vocabulary, 3)) for i in range(count)]
+
+    def setup():
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), id=1, name="wendy")
+            for chunk in chunked(
+                {"id": i, "user_id": 1, "headline": "post %d" % i} for i in range(count)
+            ):
+                conn.execute(BlogPost.__table__.insert(), chunk)
+        return engine
+
+    print("----------------------------------------")
+    print("Tag %d posts with 3 keywords each" % count)
+    print("----------------------------------------")
+    engine = setup()
+    session = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    with QueryCounter(engine) as counter:
+        for post_id, words in tags:
+            for word in words:
+                id = session.execute(
+                    select([Keyword.__table__.c.id]).where(
+                        Keyword.__table__.c.keyword == word
+                    )
+                ).scalar()
+                if id is None:
+                    id = session.execute(
+                        Keyword.__table__.insert(), {"keyword": word}
+                    ).inserted_primary_key[0]
+                session.execute(
+                    post_keywords.insert(), {"post_id": post_id, "keyword_id": id}
+                )
+        session.commit()
+    print(
+        "select per tag: %7d round trips  %.3f s"
+        % (counter.count, time.perf_counter() - start)
+    )
+
+    engine = setup()
+    session = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    with QueryCounter(engine) as counter:
+        for batch in chunked(tags, 10000):
+            ids = keyword_ids(
+                session, [word for post_id, words in batch for word in words]
+            )
+            session.execute(
+                post_keywords.insert(),
+                [
+                    {"post_id": post_id, "keyword_id": ids[word]}
+                    for post_id, words in batch
+                    for word in words
+                ],
+            )
+        session.commit()
+    print(
+        "keyword_ids():  %7d round trips  %.3f s  %s"
+        % (counter.count, time.perf_counter() - start, cache_for(engine).stats())
+    )
@@ -0,0 +1,181 @@
+import math
+import sys
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import (defaultload, joinedload, selectinload, sessionmaker,
+                            subqueryload)
+
+from bulkload import chunked
+from model.orm import Address, Base, BlogPost, Keyword, User, post_keywords
+
+# selectinload emits one IN query per this many parents
+SELECTIN_CHUNK_SIZE = 500
+
+STRATEGIES = {
+    "joined": joinedload,
+    "selectin": selectinload,
+    "subquery": subqueryload,
+}
+
+
+class QueryShape(object):
+    """An entity and the loader strategy of each relationship path to load."""
+
+    def __init__(self, entity, strategies):
+        self.entity = entity
+        self.strategies = strategies
+
+    def max_queries(self, rows):
+        """How many SELECTs loading rows instances may issue."""
+        count = 1
+        for strategy in self.strategies.values():
+            if strategy == "selectin":
+                count += max(1, int(math.ceil(rows / float(SELECTIN_CHUNK_SIZE))))
+            elif strategy == "subquery":
+                count += 1
+        return count
+
+    def options(self):
+        options = []
+        for path, strategy in self.strategies.items():
+            # "addresses.user"-style paths reach the last relationship through
+            # the ones before it, leaving their own loading as configured
+            keys = path.split(".")
+            entity = self.entity
+            option = None
+            for i, key in enumerate(keys):
+                attribute = getattr(entity, key)
+                loader = STRATEGIES[strategy] if i == len(keys) - 1 else defaultload
+                if option is None:
+                    option = loader(attribute)
+                else:
+                    option = getattr(option, loader.__name__)(attribute)
+                entity = attribute.property.mapper.class_
+            options.append(option)
+        return options
+
+    def touch(self, instance):
+        for path in self.strategies:
+            targets = [instance]
+            for key in path.split("."):
+                loaded = []
+                for target in targets:
+                    value = getattr(target, key)
+                    if isinstance(value, list):
+                        loaded.extend(value)
+                    elif value is not None:
+                        loaded.append(value)
+                targets = loaded
+
+
+shapes = {
+    "user": QueryShape(User, {}),
+    "user with addresses": QueryShape(User, {"addresses": "selectin"}),
+    "address with user": QueryShape(Address, {"user": "joined"}),
+    "post with author": QueryShape(BlogPost, {"author": "joined"}),
+    "post with author and keywords": QueryShape(
+        BlogPost, {"author": "joined", "keywords": "selectin"}
+    ),
+}
+
+
+class QueryCounter(object):
+    """Count the statements an engine executes inside a with block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def before_cursor_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self.before_cursor_execute)
+
+
+def query(session, shape):
+    """session.query() for the shape's entity, with its loader options."""
+    shape = shapes[shape]
+    return session.query(shape.entity).options(*shape.options())
+
+
+def load(session, shape, criterion=None):
+    """Load a shape and its relationships, failing if it goes over budget."""
+    q = query(session, shape)
+    if criterion is not None:
+        q = q.filter(criterion)
+    with QueryCounter(session.get_bind()) as counter:
+        instances = q.all()
+        for instance in instances:
+            shapes[shape].touch(instance)
+    allowed = shapes[shape].max_queries(len(instances))
+    if counter.count > allowed:
+        raise AssertionError(
+            "shape %r issued %d queries, at most %d allowed"
+            % (shape, counter.count, allowed)
+        )
+    return instances
+
+
+def populate(conn, count):
+    for chunk in chunked(
+        {"id": i, "name": "user%d" % i, "fullname": "User %d" % i} for i in range(count)
+    ):
+        conn.execute(User.__table__.insert(), chunk)
+    for chunk in chunked(
+        {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+        for i in range(count * 2)
+    ):
+        conn.execute(Address.__table__.insert(), chunk)
+    for chunk in chunked(
+        {"id": i, "user_id": i, "headline": "post %d" % i} for i in range(count)
+    ):
+        conn.execute(BlogPost.__table__.insert(), chunk)
+    conn.execute(
+        Keyword.__table__.insert(),
+        [{"id": i, "keyword": "keyword%d" % i} for i in range(100)],
+    )
+    for chunk in chunked(
+        {"post_id": i, "keyword_id": (i + k) % 100}
+        for i in range(count)
+        for k in range(3)
+    ):
+        conn.execute(post_keywords.insert(), chunk)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        populate(conn, count)
+    Session = sessionmaker(bind=engine)
+
+    print("----------------------------------------")
+    print("Lazy loading vs. query shapes (%d users)" % count)
+    print("----------------------------------------")
+    for name in ("user with addresses", "post with author and keywords"):
+        for label, q in (
+            ("lazy", lambda session: session.query(shapes[name].entity)),
+            ("shaped", lambda session: query(session, name)),
+        ):
+            session = Session()
+            start = time.perf_counter()
+            with QueryCounter(engine) as counter:
+                for instance in q(session):
+                    shapes[name].touch(instance)
+            seconds = time.perf_counter() - start
+            session.close()
+            print(
+                "%-30s %-7s SELECTs: %6d  %7.3f s"
+                % (name, label, counter.count, seconds)
+            )
+        session = Session()
+        load(session, name)
+        session.close()
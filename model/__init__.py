@@ -0,0 +1,41 @@
+"""The schema of core.py and orm.py, importable without side effects.
+
+model.tables holds the Core tables, model.orm the declarative classes and
+model.session the engine and session factory, created on first use. The
+names below are imported from their submodule when first accessed, so
+"import model" does not import SQLAlchemy.
+"""
+
+import importlib
+
+# name -> the submodule defining it
+EXPORTS = {
+    "metadata": "tables",
+    "users": "tables",
+    "addresses": "tables",
+    "Base": "orm",
+    "User": "orm",
+    "Address": "orm",
+    "BlogPost": "orm",
+    "Keyword": "orm",
+    "post_keywords": "orm",
+    "Session": "session",
+    "get_engine": "session",
+    "get_session": "session",
+}
+
+__all__ = sorted(EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        submodule = EXPORTS[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module("." + submodule, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
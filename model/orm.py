@@ -0,0 +1,144 @@
+from sqlalchemy import (Column, ForeignKey, Integer, String, Table, Text, event,
+                        inspect, select)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, object_session, relationship
+from sqlalchemy.orm.util import identity_key
+
+Base = declarative_base()
+
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    fullname = Column(String)
+    nickname = Column(String)
+    # maintained by the Address and BlogPost flush events below
+    address_count = Column(Integer, nullable=False, default=0, server_default="0")
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    addresses = relationship("Address", back_populates='user', cascade="all, delete, delete-orphan")
+    posts = relationship("BlogPost", back_populates="author", lazy="dynamic")
+
+    def __repr__(self):
+        return "<User(name='%s', fullname='%s', nickname='%s')>" % (
+            self.name,
+            self.fullname,
+            self.nickname,
+        )
+
+
+class Address(Base):
+    __tablename__ = "addresses"
+
+    id = Column(Integer, primary_key=True)
+    email_address = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    user = relationship("User", back_populates="addresses")
+
+    def __repr__(self):
+        return "<Address(email_address='%s')>" % self.email_address
+
+
+post_keywords = Table('post_keywords', Base.metadata,
+    Column('post_id', ForeignKey('posts.id'), primary_key=True),
+    Column('keyword_id', ForeignKey('keywords.id'), primary_key=True, index=True)
+ )
+
+class BlogPost(Base):
+    __tablename__ = 'posts'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    headline = Column(String, nullable=False)
+    body = Column(Text)
+
+    # many to many BlogPost<->Keyword
+    keywords = relationship('Keyword', secondary=post_keywords, back_populates='posts')
+    author = relationship("User", back_populates="posts")
+
+    def __init__(self, headline, body, author):
+        self.author = author
+        self.headline = headline
+        self.body = body
+
+    def __repr__(self):
+        return "BlogPost(%r, %r, %r)" % (self.headline, self.body, self.author)
+
+
+class Keyword(Base):
+    __tablename__ = 'keywords'
+
+    id = Column(Integer, primary_key=True)
+    keyword = Column(String, nullable=False, unique=True)
+    posts = relationship('BlogPost', secondary=post_keywords, back_populates='keywords')
+
+    def __init__(self, keyword):
+        self.keyword = keyword
+
+
+def count_child(connection, target, counter, user_id, delta):
+    if user_id is None:
+        return
+    users = User.__table__
+    connection.execute(
+        users.update()
+        .where(users.c.id == user_id)
+        .values({counter: users.c[counter] + delta})
+    )
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("user_counts", set()).add((user_id, counter))
+
+
+def count_moved(connection, target, counter):
+    if not inspect(target).attrs.user_id.history.has_changes():
+        return
+    # the previous owner may never have been loaded, the row still has it
+    table = type(target).__table__
+    previous = connection.scalar(
+        select([table.c.user_id]).where(table.c.id == target.id)
+    )
+    if previous != target.user_id:
+        count_child(connection, target, counter, previous, -1)
+        count_child(connection, target, counter, target.user_id, 1)
+
+
+@event.listens_for(Address, "after_insert")
+def address_inserted(mapper, connection, target):
+    count_child(connection, target, "address_count", target.user_id, 1)
+
+
+@event.listens_for(Address, "after_delete")
+def address_deleted(mapper, connection, target):
+    count_child(connection, target, "address_count", target.user_id, -1)
+
+
+@event.listens_for(Address, "before_update")
+def address_moved(mapper, connection, target):
+    count_moved(connection, target, "address_count")
+
+
+@event.listens_for(BlogPost, "after_insert")
+def post_inserted(mapper, connection, target):
+    count_child(connection, target, "post_count", target.user_id, 1)
+
+
+@event.listens_for(BlogPost, "after_delete")
+def post_deleted(mapper, connection, target):
+    count_child(connection, target, "post_count", target.user_id, -1)
+
+
+@event.listens_for(BlogPost, "before_update")
+def post_moved(mapper, connection, target):
+    count_moved(connection, target, "post_count")
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def expire_user_counts(session, flush_context):
+    # the counts were changed with SQL, reload them on next access
+    for user_id, counter in session.info.pop("user_counts", ()):
+        user = session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            session.expire(user, [counter])
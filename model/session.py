@@ -0,0 +1,54 @@
+import os
+import threading
+
+from sqlalchemy.orm import sessionmaker
+
+DEFAULT_URL = "sqlite:///orm.sqlite3"
+
+# bound to the engine when get_engine() first creates it
+Session = sessionmaker()
+
+engine = None
+lock = threading.Lock()
+
+
+def database_url():
+    return os.environ.get("DATABASE_URL", DEFAULT_URL)
+
+
+def get_engine(url=None, **kwargs):
+    """The process-wide engine, created on first use.
+
+    url defaults to $DATABASE_URL, then to orm.sqlite3; it and kwargs only
+    matter for the call that creates the engine. Unlike the single writer
+    connection of create_sqlite_engine(), the pool lets several sessions be
+    open at once; with WAL they read concurrently and the busy timeout
+    queues their writes.
+    """
+    global engine
+    if engine is None:
+        with lock:
+            if engine is None:
+                # engines pulls in the pool and event machinery, only when needed
+                from engines import create_sqlite_engine
+
+                kwargs.setdefault("pool_size", 5)
+                kwargs.setdefault("max_overflow", 10)
+                engine = create_sqlite_engine(url or database_url(), **kwargs)
+                Session.configure(bind=engine)
+    return engine
+
+
+def get_session(**kwargs):
+    get_engine()
+    return Session(**kwargs)
+
+
+def dispose():
+    """Close the engine's connections and forget it, e.g. after a fork."""
+    global engine
+    with lock:
+        if engine is not None:
+            engine.dispose()
+            engine = None
+            Session.configure(bind=None)
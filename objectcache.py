@@ -0,0 +1,378 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bulkload import chunked
+from model.orm import Address, Base, Keyword, User
+from resultcache import written_table
+
+# mapped class -> the attributes it can also be looked up by
+NATURAL_KEYS = OrderedDict([(User, ("name",)), (Keyword, ("keyword",))])
+
+
+def sizeof(values):
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+
+class ObjectCache(object):
+    """Column values of User and Keyword rows, shared by all sessions.
+
+    get() and get_by() look in the session's identity map, then in the
+    cache, and only then SELECT; a cached row is turned back into an
+    instance of the session without querying. Entries are keyed by primary
+    key, with an index from the natural keys (User.name, Keyword.keyword)
+    to it, and evicted least recently used first or ttl seconds after they
+    were read.
+
+    Flushes drop the rows they insert, update or delete, including the
+    users whose address_count or post_count they change, and drop them
+    again when their transaction ends; until then that session bypasses the
+    cache for the classes it wrote. Any other INSERT, UPDATE or DELETE of
+    users or keywords seen on an engine, such as those of delete_users()
+    and bulk_update() or plain Core statements, drops every cached row of
+    the class, then again when its transaction ends. Writes made by other
+    processes are only seen once the ttl expires.
+    """
+
+    def __init__(self, natural_keys=NATURAL_KEYS, maxsize=10000, ttl=300):
+        self.natural_keys = natural_keys
+        self.tables = {cls.__table__.name: cls for cls in natural_keys}
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # (class, primary key) -> (expires, column values, natural keys)
+        self.entries = OrderedDict()
+        # (class, attribute, value) -> primary key
+        self.index = {}
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def enable(self):
+        if not self.enabled:
+            event.listen(Session, "after_begin", self.after_begin)
+            event.listen(Session, "after_flush", self.after_flush)
+            event.listen(Session, "after_commit", self.end_transaction)
+            event.listen(Session, "after_rollback", self.end_transaction)
+            event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+            event.listen(Engine, "commit", self.end_connection_transaction)
+            event.listen(Engine, "rollback", self.end_connection_transaction)
+            self.enabled = True
+        return self
+
+    def disable(self):
+        if self.enabled:
+            event.remove(Session, "after_begin", self.after_begin)
+            event.remove(Session, "after_flush", self.after_flush)
+            event.remove(Session, "after_commit", self.end_transaction)
+            event.remove(Session, "after_rollback", self.end_transaction)
+            event.remove(Engine, "after_cursor_execute", self.after_cursor_execute)
+            event.remove(Engine, "commit", self.end_connection_transaction)
+            event.remove(Engine, "rollback", self.end_connection_transaction)
+            self.enabled = False
+            self.clear()
+        return self
+
+    def after_begin(self, session, transaction, connection):
+        # lets after_cursor_execute find the session a statement runs for
+        connection.info["object_cache_session"] = weakref.ref(session)
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        cls = self.tables.get(written_table(statement))
+        if cls is None:
+            return
+        session = conn.info.get("object_cache_session", lambda: None)()
+        if session is not None and session._flushing:
+            # after_flush knows which rows the flush wrote
+            return
+        if session is not None and self.in_transaction(session, conn):
+            session.info.setdefault("object_cache_dirty", set()).add((cls,))
+        conn.info.setdefault("object_cache_written", set()).add((cls,))
+        self.invalidate_keys([(cls,)])
+
+    def in_transaction(self, session, conn):
+        # the pooled connection may have been handed to someone else since
+        transaction = session.transaction
+        return transaction is not None and any(
+            connection.connection is conn.connection
+            for connection, _, _ in transaction._connections.values()
+        )
+
+    def end_connection_transaction(self, conn):
+        self.invalidate_keys(conn.info.pop("object_cache_written", ()))
+
+    def after_flush(self, session, flush_context):
+        changed = set()
+        for instance in session.new | session.dirty | session.deleted:
+            if type(instance) not in self.natural_keys:
+                continue
+            state = inspect(instance)
+            ident = tuple(state.mapper.primary_key_from_instance(instance))
+            changed.add((type(instance), ident))
+            # a renamed or new row changes what its old and new names point to
+            for attr in self.natural_keys[type(instance)]:
+                history = state.attrs[attr].history
+                for value in history.added + history.deleted:
+                    changed.add((type(instance), attr, value))
+        # set by the Address and BlogPost flush events of model.orm
+        for user_id, counter in session.info.get("user_counts", ()):
+            changed.add((User, (user_id,)))
+        if changed:
+            session.info.setdefault("object_cache_dirty", set()).update(changed)
+            self.invalidate_keys(changed)
+
+    def end_transaction(self, session):
+        # whatever other sessions read meanwhile may be stale or rolled back
+        self.invalidate_keys(session.info.pop("object_cache_dirty", ()))
+
+    def invalidate_keys(self, keys):
+        with self.lock:
+            for key in keys:
+                cls = key[0]
+                self.generations[cls] = self.generations.get(cls, 0) + 1
+                self.invalidations += 1
+                if len(key) == 1:
+                    # every row of the class
+                    for entry in [entry for entry in self.entries if entry[0] is cls]:
+                        self.remove(entry)
+                    continue
+                if len(key) == 3:
+                    ident = self.index.pop(key, None)
+                else:
+                    ident = key[1]
+                if ident is not None:
+                    self.remove((cls, ident))
+
+    def invalidate(self, cls, ident):
+        """Drop the row of cls with primary key ident."""
+        if not isinstance(ident, (tuple, list)):
+            ident = [ident]
+        self.invalidate_keys([(cls, tuple(ident))])
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            for natural in entry[2]:
+                if self.index.get(natural) == key[1]:
+                    del self.index[natural]
+
+    def clear(self):
+        with self.lock:
+            for cls in self.natural_keys:
+                self.generations[cls] = self.generations.get(cls, 0) + 1
+            self.entries.clear()
+            self.index.clear()
+
+    def bypassed(self, session, cls):
+        if not self.enabled:
+            return True
+        return any(key[0] is cls for key in session.info.get("object_cache_dirty", ()))
+
+    def lookup(self, session, cls, ident):
+        """Instance of cls in session from the identity map or the cache."""
+        instance = session.identity_map.get(
+            inspect(cls).identity_key_from_primary_key(ident)
+        )
+        if instance is not None:
+            return instance
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((cls, ident))
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self.remove((cls, ident))
+                return None
+            self.entries.move_to_end((cls, ident))
+            values = entry[1]
+        return self.rebuild(session, cls, values)
+
+    def rebuild(self, session, cls, values):
+        instance = inspect(cls).class_manager.new_instance()
+        for attr, value in values.items():
+            set_committed_value(instance, attr, value)
+        # a detached copy of the row, which merge() adds without a SELECT
+        make_transient_to_detached(instance)
+        return session.merge(instance, load=False)
+
+    def store(self, cls, instance, generation):
+        state = inspect(instance)
+        if state.modified or state.unloaded & set(
+            prop.key for prop in state.mapper.column_attrs
+        ):
+            return
+        values = {prop.key: state.dict[prop.key] for prop in state.mapper.column_attrs}
+        ident = tuple(state.mapper.primary_key_from_instance(instance))
+        naturals = [
+            (cls, attr, values[attr])
+            for attr in self.natural_keys[cls]
+            if values[attr] is not None
+        ]
+        with self.lock:
+            # a flush invalidated the class while we were reading
+            if self.generations.get(cls, 0) != generation:
+                return
+            self.remove((cls, ident))
+            self.entries[(cls, ident)] = (time.monotonic() + self.ttl, values, naturals)
+            for natural in naturals:
+                self.index[natural] = ident
+            while len(self.entries) > self.maxsize:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get(self, session, cls, ident):
+        """session.query(cls).get(ident), from the cache when it can."""
+        if self.bypassed(session, cls):
+            return session.query(cls).get(ident)
+        if not isinstance(ident, (tuple, list)):
+            ident = (ident,)
+        ident = tuple(ident)
+        instance = self.lookup(session, cls, ident)
+        if instance is not None:
+            self.hits += 1
+            return instance
+        self.misses += 1
+        generation = self.generations.get(cls, 0)
+        instance = session.query(cls).get(ident)
+        if instance is not None:
+            self.store(cls, instance, generation)
+        return instance
+
+    def get_by(self, session, cls, **natural):
+        """session.query(cls).filter_by(attr=value).one(), from the cache when
+        it can; attr is one of the natural keys of cls."""
+        ((attr, value),) = natural.items()
+        if attr not in self.natural_keys[cls]:
+            raise ValueError("%s is not a natural key of %s" % (attr, cls.__name__))
+        query = session.query(cls).filter_by(**natural)
+        if self.bypassed(session, cls):
+            return query.one()
+        with self.lock:
+            ident = self.index.get((cls, attr, value))
+        if ident is not None:
+            instance = self.lookup(session, cls, ident)
+            if instance is not None:
+                self.hits += 1
+                return instance
+        self.misses += 1
+        generation = self.generations.get(cls, 0)
+        # raises when there is no row or several, a name is not unique
+        instance = query.one()
+        self.store(cls, instance, generation)
+        return instance
+
+    def stats(self):
+        with self.lock:
+            memory = (
+                sum(
+                    sizeof(entry[1].values()) + sys.getsizeof(entry[1])
+                    for entry in self.entries.values()
+                )
+                + sys.getsizeof(self.entries)
+                + sys.getsizeof(self.index)
+            )
+            size = len(self.entries)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "size": size,
+            "maxsize": self.maxsize,
+            "bytes": memory,
+        }
+
+
+def cache_objects(**kwargs):
+    return ObjectCache(**kwargs).enable()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    engine = create_engine(
+        "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "objectcache.sqlite3")
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(1, count + 1)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        conn.execute(
+            User.__table__.insert(),
+            [
+                {"name": "jack", "fullname": "Jack Bean"},
+                {"name": "wendy", "fullname": "Wendy Williams"},
+            ],
+        )
+        conn.execute(
+            Keyword.__table__.insert(), [{"keyword": "wendy"}, {"keyword": "firstpost"}]
+        )
+
+    def workload(cache):
+        # each request of orm.py starts a new session with an empty identity map
+        start = time.perf_counter()
+        for i in range(sessions):
+            session = Session(bind=engine)
+            for name in ("jack", "wendy"):
+                if cache is None:
+                    session.query(User).filter_by(name=name).one()
+                else:
+                    cache.get_by(session, User, name=name)
+            for keyword in ("wendy", "firstpost"):
+                if cache is None:
+                    session.query(Keyword).filter_by(keyword=keyword).one()
+                else:
+                    cache.get_by(session, Keyword, keyword=keyword)
+            user_id = i % count + 1
+            if cache is None:
+                session.query(User).get(user_id)
+            else:
+                cache.get(session, User, user_id)
+            session.close()
+        return (time.perf_counter() - start) / sessions
+
+    print("----------------------------------------")
+    print("Lookups by name, keyword and id, %d sessions" % sessions)
+    print("----------------------------------------")
+    cache = cache_objects(maxsize=count // 2)
+    print("uncached: %8.3f ms per session" % (workload(None) * 1000))
+    print("cached:   %8.3f ms per session" % (workload(cache) * 1000))
+    print(cache.stats())
+
+    print("----------------------------------------")
+    print("Flushes invalidate")
+    print("----------------------------------------")
+    session = Session(bind=engine)
+    jack = cache.get_by(session, User, name="jack")
+    jack.addresses.append(Address(email_address="jack@google.com"))
+    jack.name = "jacky"
+    session.commit()
+    session.close()
+    session = Session(bind=engine)
+    jacky = cache.get_by(session, User, name="jacky")
+    print(jacky, jacky.address_count)
+    try:
+        cache.get_by(session, User, name="jack")
+    except Exception as e:
+        print("jack: %s" % e)
+    print(cache.stats())
@@ -0,0 +1,100 @@
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from aggregates import rebuild
+from bulkload import chunked
+from model.orm import Base, BlogPost, User
+
+PAGE_SIZE = 20
+
+
+def posts_page(session, user, *criterion, after=None, limit=PAGE_SIZE):
+    """One page of a user's posts ordered by id, starting after the id "after".
+
+    Keyset pagination: the index on posts.user_id (which carries the rowid)
+    seeks straight to the page, where OFFSET reads and skips every previous
+    row. Pass the id of the last post of a page to get the next one.
+    """
+    query = session.query(BlogPost).filter(BlogPost.user_id == user.id, *criterion)
+    if after is not None:
+        query = query.filter(BlogPost.id > after)
+    return query.order_by(BlogPost.id).limit(limit).all()
+
+
+def iter_pages(session, user, *criterion, limit=PAGE_SIZE):
+    after = None
+    while True:
+        page = posts_page(session, user, *criterion, after=after, limit=limit)
+        if not page:
+            return
+        yield page
+        after = page[-1].id
+
+
+def rebuild_post_counts(conn):
+    """Recompute users.post_count from posts, e.g. after Core bulk loads."""
+    rebuild(conn, ["post_count"])
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), id=1, name="wendy")
+        for chunk in chunked(
+            {"user_id": 1, "headline": "post %d" % i} for i in range(count)
+        ):
+            conn.execute(BlogPost.__table__.insert(), chunk)
+        rebuild_post_counts(conn)
+    session = sessionmaker(bind=engine)()
+    wendy = session.query(User).filter_by(name="wendy").one()
+
+    print("----------------------------------------")
+    print("Count posts (%d posts)" % count)
+    print("----------------------------------------")
+    start = time.perf_counter()
+    counted = wendy.posts.count()
+    print(
+        "posts.count(): %d in %.3f ms" % (counted, (time.perf_counter() - start) * 1000)
+    )
+    start = time.perf_counter()
+    session.expire(wendy, ["post_count"])
+    print(
+        "post_count:    %d in %.3f ms"
+        % (wendy.post_count, (time.perf_counter() - start) * 1000)
+    )
+
+    print("----------------------------------------")
+    print("Last page")
+    print("----------------------------------------")
+    start = time.perf_counter()
+    page = wendy.posts.order_by(BlogPost.id)[count - PAGE_SIZE : count]
+    print("OFFSET slice: %.3f ms" % ((time.perf_counter() - start) * 1000))
+    start = time.perf_counter()
+    page = posts_page(session, wendy, after=page[0].id - 1)
+    print("keyset:       %.3f ms" % ((time.perf_counter() - start) * 1000))
+
+    print("----------------------------------------")
+    print("Walk every page")
+    print("----------------------------------------")
+    start = time.perf_counter()
+    pages = 0
+    for page in iter_pages(session, wendy, limit=1000):
+        pages += 1
+    print("%d keyset pages in %.3f s" % (pages, time.perf_counter() - start))
+
+    print("----------------------------------------")
+    print("Incremental post_count")
+    print("----------------------------------------")
+    post = BlogPost("Wendy's Blog Post", "This is a test", wendy)
+    session.add(post)
+    session.commit()
+    print(wendy.post_count)
+    session.delete(post)
+    session.commit()
+    print(wendy.post_count)
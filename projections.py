@@ -0,0 +1,139 @@
+import gc
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from bulkload import chunked
+from model.orm import Address, Base, BlogPost, User
+
+CHUNK_SIZE = 10000
+
+# mapped class -> its row class, generated on first use
+row_classes = {}
+
+
+def row_class(entity):
+    """A namedtuple of the column attributes of entity, e.g. UserRow.
+
+    Its instances are plain tuples: no __dict__, no InstanceState, nothing
+    for a Session to track, and read-only.
+    """
+    cls = row_classes.get(entity)
+    if cls is None:
+        keys = [prop.key for prop in inspect(entity).column_attrs]
+        cls = row_classes[entity] = namedtuple(entity.__name__ + "Row", keys)
+        cls.entity = entity
+    return cls
+
+
+def entity_of(query):
+    entities = query._entities
+    if len(entities) != 1 or entities[0].entity_zero is None:
+        raise ValueError("project a query on a single mapped class")
+    return entities[0].entity_zero.class_
+
+
+def iterate(query, chunk_size=CHUNK_SIZE):
+    """Rows of query(Entity), with its filters and order, as Entity rows.
+
+    Only the columns of the class are selected and each database row is
+    turned into a row_class() tuple, bypassing the ORM loading machinery.
+    """
+    entity = entity_of(query)
+    cls = row_class(entity)
+    columns = [getattr(entity, key) for key in cls._fields]
+    conn = query.session.connection()
+    result = conn.execution_options(stream_results=True).execute(
+        query.with_entities(*columns).statement, query._params
+    )
+    try:
+        make = cls._make
+        if any(result._metadata._processors):
+            # types converting their values, let the result apply them
+            fetch = result.fetchmany
+        else:
+            fetch = result.cursor.fetchmany
+        while True:
+            rows = fetch(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield make(row)
+    finally:
+        result.close()
+
+
+def project(query, chunk_size=CHUNK_SIZE):
+    """List of the rows of query(Entity) as row_class(Entity) tuples."""
+    return list(iterate(query, chunk_size))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+
+    def entities(session):
+        return session.query(User).order_by(User.id).all()
+
+    def projected(session):
+        return project(session.query(User).order_by(User.id))
+
+    def measure(label, load):
+        session = Session(bind=engine)
+        start = time.perf_counter()
+        rows = load(session)
+        seconds = time.perf_counter() - start
+        del rows
+        session.close()
+        gc.collect()
+        # tracing slows allocations down, measure memory in a second run
+        session = Session(bind=engine)
+        tracemalloc.start()
+        rows = load(session)
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            "%-22s %8d rows %8.3f s  held %8.1f MB (%4d bytes/row)  peak %8.1f MB"
+            % (
+                label,
+                len(rows),
+                seconds,
+                held / 1024.0 / 1024,
+                held / len(rows),
+                peak / 1024.0 / 1024,
+            )
+        )
+        del rows
+        session.close()
+        gc.collect()
+
+    print("----------------------------------------")
+    print("Load %d users ordered by id" % count)
+    print("----------------------------------------")
+    measure("query(User).all()", entities)
+    measure("project(query(User))", projected)
+
+    print("----------------------------------------")
+    print("Row classes")
+    print("----------------------------------------")
+    session = Session(bind=engine)
+    user = next(iterate(session.query(User).filter(User.name == "user1")))
+    print(user, user.name)
+    try:
+        user.name = "jack"
+    except AttributeError as e:
+        print("read-only: %s" % e)
+    for entity in (Address, BlogPost):
+        print(row_class(entity)._fields)
@@ -0,0 +1,265 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import Table, create_engine, event, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+from bulkload import chunked
+from model.orm import Address, Base, User
+
+WRITES = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?"
+    r"|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)"
+    r"\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+
+
+def written_table(statement):
+    match = WRITES.match(statement)
+    return match.group(1) if match else None
+
+
+def read_tables(stmt):
+    return frozenset(
+        table.name
+        for table in find_tables(stmt, check_columns=True, include_aliases=True)
+        if isinstance(table, Table)
+    )
+
+
+class ResultCache(object):
+    """Read-through cache of fetched rows, invalidated per table on writes.
+
+    Entries are keyed by the compiled SQL and its parameters and remember
+    the generation of every table they read. Any INSERT, UPDATE or DELETE
+    seen on the engine bumps the generation of its table, and so does the
+    end of the transaction that ran it, which drops whatever another
+    connection cached while the write was still uncommitted. Rows read
+    before a write are never stored after it, and a connection does not
+    use the cache for tables it has written to in its open transaction.
+    """
+
+    def __init__(self, engine, maxsize=1024, ttl=60):
+        self.engine = engine
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def enable(self):
+        if not self.enabled:
+            event.listen(self.engine, "after_cursor_execute", self.after_cursor_execute)
+            event.listen(self.engine, "commit", self.end_transaction)
+            event.listen(self.engine, "rollback", self.end_transaction)
+            self.enabled = True
+        return self
+
+    def disable(self):
+        if self.enabled:
+            event.remove(self.engine, "after_cursor_execute", self.after_cursor_execute)
+            event.remove(self.engine, "commit", self.end_transaction)
+            event.remove(self.engine, "rollback", self.end_transaction)
+            self.enabled = False
+            self.clear()
+        return self
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        table = written_table(statement)
+        if table is not None:
+            conn.info.setdefault("result_cache_dirty", set()).add(table)
+            self.invalidate(table)
+
+    def end_transaction(self, conn):
+        for table in conn.info.pop("result_cache_dirty", ()):
+            self.invalidate(table)
+
+    def invalidate(self, *tables):
+        with self.lock:
+            for table in tables:
+                self.generations[table] = self.generations.get(table, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def execute(self, conn, stmt, params=None, tables=None):
+        """Rows of stmt run on conn (a Connection or Session), as a list.
+
+        tables names what stmt reads, it is found from the statement when
+        not given. Textual SQL has no tables to find and is not cached
+        unless they are named.
+        """
+        if isinstance(conn, Session):
+            conn = conn.connection()
+        compiled = stmt.compile(dialect=conn.dialect)
+        params = compiled.construct_params(params)
+        tables = read_tables(stmt) if tables is None else frozenset(tables)
+        if (
+            not tables
+            or not self.enabled
+            or tables & conn.info.get("result_cache_dirty", set())
+        ):
+            return conn.execute(compiled, params).fetchall()
+        try:
+            key = (compiled.string, tuple(sorted(params.items())))
+            hash(key)
+        except TypeError:
+            # list parameters and the like
+            return conn.execute(compiled, params).fetchall()
+
+        now = time.monotonic()
+        with self.lock:
+            generations = tuple(self.generations.get(table, 0) for table in tables)
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, cached_generations, rows = entry
+                if expires > now and cached_generations == generations:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return list(rows)
+                del self.entries[key]
+            self.misses += 1
+
+        rows = conn.execute(compiled, params).fetchall()
+
+        with self.lock:
+            # a write that happened while we read makes these rows stale
+            if generations == tuple(self.generations.get(table, 0) for table in tables):
+                self.entries[key] = (now + self.ttl, generations, rows)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return list(rows)
+
+    def scalar(self, conn, stmt, params=None, tables=None):
+        rows = self.execute(conn, stmt, params, tables)
+        return rows[0][0] if rows else None
+
+    def all(self, query, tables=None):
+        """Rows of an ORM column query, such as session.query(User.name).
+
+        The session is autoflushed first, as when the query runs itself.
+        """
+        query.session._autoflush()
+        # the statement has the values of query.params() bound
+        return self.execute(query.session, query.statement, tables=tables)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+
+def cache_results(engine, **kwargs):
+    return ResultCache(engine, **kwargs).enable()
+
+
+# the orm.py and core.py counting patterns
+
+
+def address_counts():
+    addresses = Address.__table__
+    return (
+        select([addresses.c.user_id, func.count(addresses.c.id).label("num_addresses")])
+        .group_by(addresses.c.user_id)
+        .order_by(addresses.c.user_id)
+    )
+
+
+def user_count():
+    return select([func.count(User.id)])
+
+
+def users_with_address_counts(session):
+    stmt = (
+        session.query(Address.user_id, func.count("*").label("address_count"))
+        .group_by(Address.user_id)
+        .subquery()
+    )
+    return (
+        session.query(User.name, stmt.c.address_count)
+        .outerjoin(stmt, User.id == stmt.c.user_id)
+        .order_by(User.id)
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    engine = create_engine(
+        "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "resultcache.sqlite3")
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ):
+            conn.execute(Address.__table__.insert(), chunk)
+
+    def workload(session, cache, write_every):
+        start = time.perf_counter()
+        for i in range(reads):
+            if cache is None:
+                session.execute(address_counts()).fetchall()
+                session.execute(user_count()).scalar()
+                users_with_address_counts(session).all()
+            else:
+                cache.execute(session, address_counts())
+                cache.scalar(session, user_count())
+                cache.all(users_with_address_counts(session))
+            if write_every and i % write_every == 0:
+                session.add(User(name="new%d" % i))
+                session.commit()
+        return (time.perf_counter() - start) / reads
+
+    print("----------------------------------------")
+    print("Counting queries, %d users (%d reads)" % (count, reads))
+    print("----------------------------------------")
+    cache = cache_results(engine)
+    for write_every in (0, 50, 10, 1):
+        session = Session(bind=engine)
+        uncached = workload(session, None, write_every)
+        cache.clear()
+        cached = workload(session, cache, write_every)
+        session.close()
+        print(
+            "write every %-4s uncached: %8.2f ms  cached: %8.2f ms"
+            % (write_every or "-", uncached * 1000, cached * 1000)
+        )
+    print(cache.stats())
+
+    print("----------------------------------------")
+    print("Committed writes are seen")
+    print("----------------------------------------")
+    session = Session(bind=engine)
+    before = cache.scalar(session, user_count())
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), name="committed")
+    after = cache.scalar(session, user_count())
+    session.close()
+    print("users before: %d  after: %d" % (before, after))
@@ -0,0 +1,129 @@
+import hashlib
+import time
+from datetime import datetime
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table,
+                        inspect, select)
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+# kept outside the application MetaData so it never changes the fingerprint
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def fingerprint(metadata, dialect):
+    """Hash the DDL the dialect would emit for every table and index."""
+    digest = hashlib.sha256()
+    for table in metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+
+def stored_fingerprint(conn):
+    if not conn.dialect.has_table(conn, schema_version.name):
+        return None
+    return conn.execute(
+        select([schema_version.c.fingerprint]).where(schema_version.c.id == 1)
+    ).scalar()
+
+
+def upgrade(conn, metadata):
+    """Apply additive changes only: missing tables, columns and indexes.
+
+    Returns the columns added to existing tables.
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            table.create(conn)
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                conn.execute(
+                    "ALTER TABLE %s ADD COLUMN %s"
+                    % (
+                        conn.dialect.identifier_preparer.format_table(table),
+                        CreateColumn(column).compile(dialect=conn.dialect),
+                    )
+                )
+                added.append(column)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+    return added
+
+
+def backfill(conn, columns):
+    """Compute the denormalized columns upgrade() added with their default.
+
+    users.address_count and users.post_count start at 0 on existing rows.
+    """
+    counters = [column.name for column in columns if column.table.name == "users"]
+    if counters:
+        # aggregates imports the ORM model, only when there is something to do
+        from aggregates import COUNTERS, rebuild
+
+        counters = [counter for counter in counters if counter in COUNTERS]
+        if counters:
+            rebuild(conn, counters)
+
+
+def bootstrap(engine, metadata):
+    """Bring the database up to metadata, skipping all DDL when nothing changed.
+
+    Returns True when DDL was applied.
+    """
+    current = fingerprint(metadata, engine.dialect)
+    with engine.begin() as conn:
+        stored = stored_fingerprint(conn)
+        if stored == current:
+            return False
+        if stored is None:
+            schema_version.create(conn, checkfirst=True)
+        backfill(conn, upgrade(conn, metadata))
+        conn.execute(schema_version.delete())
+        conn.execute(
+            schema_version.insert(),
+            id=1,
+            fingerprint=current,
+            applied_at=datetime.utcnow(),
+        )
+    return True
+
+
+def truncate(conn, metadata):
+    """Delete every row, children first, without touching the schema."""
+    with conn.begin():
+        for table in reversed(metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+if __name__ == "__main__":
+    from sqlalchemy import create_engine
+
+    from model.orm import Base
+
+    engine = create_engine("sqlite:///orm.sqlite3")
+
+    print("----------------------------------------")
+    print("Bootstrap")
+    print("----------------------------------------")
+    for attempt in range(2):
+        start = time.perf_counter()
+        applied = bootstrap(engine, Base.metadata)
+        print(
+            "applied DDL:", applied, "; %.2f ms" % ((time.perf_counter() - start) * 1000)
+        )
@@ -0,0 +1,255 @@
+import sys
+import time
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, literal_column, or_, select, sql
+from sqlalchemy.sql.expression import Alias
+
+from bulkload import chunked
+from model.orm import Address, Base, BlogPost, User
+
+# table -> the columns its FTS5 index covers
+INDEXES = OrderedDict(
+    [
+        (User.__table__, ("name", "fullname", "nickname")),
+        (Address.__table__, ("email_address",)),
+        (BlogPost.__table__, ("headline", "body")),
+    ]
+)
+
+# the trigram tokenizer indexes every 3 characters, so any substring of 3
+# characters or more can be found, with MATCH as well as with LIKE
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+    {columns}, content='{table}', content_rowid='id', tokenize='trigram'
+)
+"""
+
+CREATE_TRIGGERS = (
+    """
+CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});
+END
+""",
+    # only for the indexed columns, not every post_count update
+    """
+CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} BEGIN
+    INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});
+    INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});
+END
+""",
+)
+
+
+def fts_name(table):
+    return "%s_fts" % table.name
+
+
+def fts_table(indexed_table):
+    return sql.table(
+        fts_name(indexed_table),
+        sql.column("rowid"),
+        sql.column("rank"),
+        *(sql.column(name) for name in INDEXES[indexed_table])
+    )
+
+
+def fts_match(fts, query):
+    return literal_column(fts.name).op("MATCH")(query)
+
+
+def create_search_index(conn):
+    """Create the FTS5 tables and their sync triggers, indexing existing rows."""
+    for table, columns in INDEXES.items():
+        names = {
+            "fts": fts_name(table),
+            "table": table.name,
+            "columns": ", ".join(columns),
+            "new": ", ".join("new.%s" % column for column in columns),
+            "old": ", ".join("old.%s" % column for column in columns),
+        }
+        conn.execute(CREATE_INDEX.format(**names))
+        for trigger in CREATE_TRIGGERS:
+            conn.execute(trigger.format(**names))
+        conn.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(**names))
+
+
+def drop_search_index(conn):
+    for table in INDEXES:
+        fts = fts_name(table)
+        for trigger in ("insert", "delete", "update"):
+            conn.execute("DROP TRIGGER IF EXISTS %s_%s" % (fts, trigger))
+        conn.execute("DROP TABLE IF EXISTS %s" % fts)
+
+
+def phrase(value):
+    """value as an FTS5 string: matches it anywhere, operators and all."""
+    return '"%s"' % value.replace('"', '""')
+
+
+def indexed(column):
+    """(table, selectable the column is from) when the column is indexed."""
+    selectable = column.table
+    table = selectable.element if isinstance(selectable, Alias) else selectable
+    if column.name in INDEXES.get(table, ()):
+        return table, selectable
+    return None, None
+
+
+def matching(indexed_table, query, columns=None):
+    """rowid and rank of the rows of a table matching an FTS5 query."""
+    fts = fts_table(indexed_table)
+    if columns:
+        query = "{%s} : %s" % (" ".join(columns), query)
+    return select([fts.c.rowid, fts.c.rank]).where(fts_match(fts, query))
+
+
+def match(column, value):
+    """column contains value, answered from the column's trigram index.
+
+    match(User.name, "wendy") becomes
+    users.id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?)
+    with the value quoted as a phrase for the name column. The trigram
+    index needs 3 characters, shorter values fall back to LIKE as in
+    search().
+    """
+    table, selectable = indexed(column)
+    if table is None:
+        raise ValueError("%s has no search index" % column)
+    if len(value) < 3:
+        return column.contains(value, autoescape=True)
+    fts = fts_table(table)
+    query = "{%s} : %s" % (column.name, phrase(value))
+    lookup = select([fts.c.rowid]).where(fts_match(fts, query))
+    return selectable.c.id.in_(lookup)
+
+
+def like(column, pattern):
+    """column LIKE pattern, answered from the column's trigram index.
+
+    Patterns with at least 3 characters between wildcards use the index;
+    SQLite's LIKE is case insensitive, so this also stands in for ilike.
+    """
+    table, selectable = indexed(column)
+    if table is None:
+        return column.like(pattern)
+    fts = fts_table(table)
+    lookup = select([fts.c.rowid]).where(fts.c[column.name].like(pattern))
+    return selectable.c.id.in_(lookup)
+
+
+def search(session, entity, value, *columns, limit=20):
+    """Instances of entity containing value, best ranked (bm25) first.
+
+    columns restricts the search to some of the indexed columns. The
+    trigram index needs 3 characters, shorter values fall back to LIKE.
+    """
+    table = entity.__table__
+    columns = [column.key for column in columns] or INDEXES[table]
+    if len(value) < 3:
+        pattern = "%%%s%%" % value
+        return (
+            session.query(entity)
+            .filter(or_(*(table.c[column].like(pattern) for column in columns)))
+            .order_by(table.c.id)
+            .limit(limit)
+            .all()
+        )
+    ranked = matching(table, phrase(value), columns).alias()
+    return (
+        session.query(entity)
+        .join(ranked, table.c.id == ranked.c.rowid)
+        .order_by(ranked.c.rank)
+        .limit(limit)
+        .all()
+    )
+
+
+if __name__ == "__main__":
+    from sqlalchemy.orm import sessionmaker
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {
+                "id": i,
+                "name": "user%d" % i,
+                "fullname": "User %d" % i,
+                "nickname": "nick%d" % i,
+            }
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+        for chunk in chunked(
+            {"user_id": i // 2, "email_address": "user%d@example.com" % i}
+            for i in range(count * 2)
+        ):
+            conn.execute(Address.__table__.insert(), chunk)
+        # indexing once after a bulk load beats the triggers row by row
+        start = time.perf_counter()
+        create_search_index(conn)
+        print("search index build: %.1f s" % (time.perf_counter() - start))
+    session = sessionmaker(bind=engine)()
+    value = "user%d" % (count // 3)
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        rows = fn()
+        print(
+            "%-40s %7d rows %9.3f ms"
+            % (label, len(rows), (time.perf_counter() - start) * 1000)
+        )
+
+    print("----------------------------------------")
+    print("Substring search (%d users, %d addresses)" % (count, count * 2))
+    print("----------------------------------------")
+    pattern = "%%%s%%" % value
+    timed(
+        "User.name.like() scan",
+        lambda: session.query(User).filter(User.name.like(pattern)).all(),
+    )
+    timed(
+        "like(User.name) index",
+        lambda: session.query(User).filter(like(User.name, pattern)).all(),
+    )
+    timed(
+        "match(User.name) index",
+        lambda: session.query(User).filter(match(User.name, value)).all(),
+    )
+    timed(
+        "Address.email_address.like() scan",
+        lambda: session.query(Address)
+        .filter(Address.email_address.like(pattern))
+        .all(),
+    )
+    timed(
+        "like(Address.email_address) index",
+        lambda: session.query(Address)
+        .filter(like(Address.email_address, pattern))
+        .all(),
+    )
+    timed("search(User) ranked", lambda: search(session, User, value))
+    timed("search(Address) ranked", lambda: search(session, Address, value))
+
+    print("----------------------------------------")
+    print("Kept in sync")
+    print("----------------------------------------")
+    user = session.query(User).get(1)
+    user.name = "wendy"
+    session.add(BlogPost("Wendy's Blog Post", "This is a test", user))
+    session.commit()
+    print(session.query(User).filter(match(User.name, "wendy")).all())
+    print(session.query(User).filter(match(User.name, "we")).all())
+    print(search(session, BlogPost, "test"))
+    session.delete(user)
+    session.commit()
+    print(session.query(User).filter(match(User.name, "wendy")).all())
+    print(session.query(User).filter(match(User.name, "wendy")))
@@ -0,0 +1,709 @@
+import heapq
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from sqlalchemy import Table, func, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    BinaryExpression,
+    BindParameter,
+    BooleanClauseList,
+    Grouping,
+    Label,
+    UnaryExpression,
+    _label_reference,
+    _textual_label_reference,
+)
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.selectable import Alias, CompoundSelect
+from sqlalchemy.sql.visitors import iterate
+
+from aggregates import COUNTERS, counters_of, rebuild, recount
+from bulkload import CHUNK_SIZE, chunked
+from engines import create_sqlite_engine
+from model.orm import Address, Base, BlogPost, Keyword, User
+from resultcache import read_tables
+
+DIALECT = sqlite.dialect()
+
+# the column each partitioned table is sharded on, all hold a users.id
+SHARD_KEYS = {"users": "id", "addresses": "user_id", "posts": "user_id"}
+
+# copied to every shard, statements reading only these run on one of them
+REPLICATED = frozenset(["keywords"])
+
+# the aggregate functions of SQLite
+AGGREGATES = frozenset(["avg", "count", "group_concat", "max", "min", "sum", "total"])
+
+# how partial aggregates computed on each shard combine into one
+COMBINE = {
+    "count": lambda a, b: a + b,
+    "sum": lambda a, b: b if a is None else a if b is None else a + b,
+    "total": lambda a, b: a + b,
+    "min": lambda a, b: b if a is None else a if b is None else min(a, b),
+    "max": lambda a, b: b if a is None else a if b is None else max(a, b),
+}
+
+
+def shard_of(user_id, shards):
+    # Fibonacci hashing spreads consecutive ids evenly over any shard count
+    return (user_id * 11400714819323198485 >> 32) % shards
+
+
+def compile_sql(stmt, params=None):
+    """SQLite SQL string and positional parameters, picklable for the workers."""
+    compiled = stmt.compile(dialect=DIALECT)
+    values = compiled.construct_params(params)
+    return compiled.string, tuple(values[name] for name in compiled.positiontup)
+
+
+# worker processes: url -> engine, created on first use after the fork
+worker_engines = {}
+
+
+def worker_engine(url):
+    engine = worker_engines.get(url)
+    if engine is None:
+        engine = worker_engines[url] = create_sqlite_engine(url)
+    return engine
+
+
+def run_query(url, sql, params):
+    with worker_engine(url).connect() as conn:
+        result = conn.execute(sql, params) if params else conn.execute(sql)
+        return result.keys(), [tuple(row) for row in result]
+
+
+def run_load(url, sql, rows):
+    with worker_engine(url).begin() as conn:
+        conn.execute(sql, rows)
+    return len(rows)
+
+
+def run_recount(url, user_ids, counters):
+    with worker_engine(url).begin() as conn:
+        recount(conn, user_ids, counters)
+    return 0
+
+
+class ShardedResult(object):
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self.rows = rows
+
+    def keys(self):
+        return self._keys
+
+    def fetchall(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def sharded_column(column):
+    table = getattr(column, "table", None)
+    if isinstance(table, Alias):
+        table = table.element
+    return isinstance(table, Table) and SHARD_KEYS.get(table.name) == column.name
+
+
+def bound(value, params):
+    if value.key in params:
+        return params[value.key]
+    return value.effective_value
+
+
+def pinned(clause, params={}):
+    """The user ids a WHERE clause restricts the shard keys to, or None.
+
+    params are the values of bind parameters given at execution time, as
+    for the lazy loads of the ORM.
+    """
+    if clause is None:
+        return None
+    if isinstance(clause, Grouping):
+        return pinned(clause.element, params)
+    if isinstance(clause, BooleanClauseList):
+        found = [pinned(child, params) for child in clause.clauses]
+        if clause.operator is operators.and_:
+            found = [ids for ids in found if ids is not None]
+            return set.intersection(*found) if found else None
+        if clause.operator is operators.or_ and None not in found:
+            return set.union(*found)
+        return None
+    ids = None
+    if isinstance(clause, BinaryExpression) and sharded_column(clause.left):
+        right = clause.right
+        if clause.operator is operators.eq and isinstance(right, BindParameter):
+            ids = {bound(right, params)}
+        elif clause.operator is operators.in_op:
+            if isinstance(right, BindParameter):
+                # expanding IN
+                ids = set(bound(right, params) or ())
+            elif isinstance(right, Grouping) and all(
+                isinstance(value, BindParameter) for value in right.element.clauses
+            ):
+                ids = set(bound(value, params) for value in right.element.clauses)
+    if ids is None or None in ids:
+        return None
+    return ids
+
+
+class Ascending(object):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        # SQLite sorts NULLs first
+        self.value = (0,) if value is None else (1, value)
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class Descending(Ascending):
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def column_index(element, columns, keys):
+    """Position in the result of a GROUP BY/ORDER BY element."""
+    if isinstance(element, _textual_label_reference):
+        name = element.element
+    else:
+        if isinstance(element, _label_reference):
+            element = element.element
+        for i, column in enumerate(columns):
+            if column is element or (
+                isinstance(column, Label) and column.element is element
+            ):
+                return i
+        name = getattr(element, "name", None)
+    if name in keys:
+        return list(keys).index(name)
+    raise NotImplementedError(
+        "cannot merge shards on %s, it must be a selected column" % element
+    )
+
+
+def selected(element, columns):
+    """The selected column a GROUP BY/ORDER BY element refers to."""
+    if isinstance(element, _textual_label_reference):
+        for column in columns:
+            if getattr(column, "name", None) == element.element:
+                return column
+        return None
+    if isinstance(element, _label_reference):
+        element = element.element
+    return element
+
+
+def sort_key(stmt, columns, keys):
+    parts = []
+    for element in stmt._order_by_clause.clauses:
+        order = Ascending
+        if isinstance(element, UnaryExpression):
+            if element.modifier is operators.desc_op:
+                order = Descending
+            element = element.element
+        parts.append((column_index(element, columns, keys), order))
+    if not parts:
+        return None
+    return lambda row: tuple(order(row[i]) for i, order in parts)
+
+
+def is_aggregate(element):
+    if not isinstance(element, FunctionElement):
+        return False
+    name = element.name.lower()
+    if name in ("min", "max"):
+        # min(a, b) and max(a, b) are scalar functions in SQLite
+        return len(element.clauses) == 1
+    return name in AGGREGATES
+
+
+def has_aggregate(column):
+    return any(is_aggregate(element) for element in iterate(column, {}))
+
+
+def aggregate(column):
+    """Name of the aggregate function a selected column is, or None.
+
+    Only aggregates whose values on each shard COMBINE merges exactly are
+    named: not avg(), nor count(DISTINCT x) and the like.
+    """
+    if isinstance(column, Label):
+        column = column.element
+    if not is_aggregate(column):
+        return None
+    name = column.name.lower()
+    if any(
+        isinstance(element, UnaryExpression)
+        and element.operator is operators.distinct_op
+        for element in iterate(column, {})
+    ):
+        # a value may be counted once on each shard
+        return None
+    return name if name in COMBINE else None
+
+
+def merge_groups(rows, group, combiners):
+    groups = OrderedDict()
+    for row in rows:
+        key = tuple(row[i] for i in group)
+        merged = groups.get(key)
+        if merged is None:
+            groups[key] = list(row)
+        else:
+            for i, combine in combiners:
+                merged[i] = combine(merged[i], row[i])
+    return [tuple(row) for row in groups.values()]
+
+
+def distinct(rows):
+    return list(OrderedDict.fromkeys(rows))
+
+
+def limit(stmt, rows):
+    offset = stmt._offset or 0
+    if stmt._limit is None:
+        return rows[offset:]
+    return rows[offset : offset + stmt._limit]
+
+
+class ShardedDatabase(object):
+    """users, addresses and posts spread over SQLite files by hash of users.id.
+
+    A user's addresses and posts live in the user's shard, so joins between
+    them stay within one file, and so do the post_keywords rows of their
+    posts; keywords are copied to every shard. Core
+    selects run on the shards their WHERE clause pins users.id (or a
+    user_id) to, else on all of them at once, one process per shard, and
+    the results are merged: ORDER BY, LIMIT/OFFSET, DISTINCT, GROUP BY with
+    count, sum, min and max, UNION and UNION ALL; other aggregates, DISTINCT
+    ones and those within other expressions raise NotImplementedError.
+    session() routes ORM primary key lookups the same way. Users need an id before they are
+    added, the id of an address or a post is only unique within its shard.
+    """
+
+    def __init__(self, directory, shards=4):
+        self.urls = [
+            "sqlite:///%s" % os.path.join(directory, "shard%d.sqlite3" % i)
+            for i in range(shards)
+        ]
+        # one process per shard: its writes are serialized, reads in parallel
+        self.executors = [ProcessPoolExecutor(1) for url in self.urls]
+        self.engines = {}
+
+    @property
+    def shards(self):
+        return len(self.urls)
+
+    def engine(self, shard):
+        engine = self.engines.get(shard)
+        if engine is None:
+            engine = self.engines[shard] = create_sqlite_engine(self.urls[shard])
+        return engine
+
+    def create_all(self):
+        for shard in range(self.shards):
+            Base.metadata.create_all(self.engine(shard))
+
+    def route(self, stmt, params={}):
+        """The shards stmt has to run on."""
+        if read_tables(stmt) <= REPLICATED:
+            return [0]
+        if isinstance(stmt, CompoundSelect):
+            shards = set()
+            for part in stmt.selects:
+                if read_tables(part) <= REPLICATED:
+                    continue
+                shards.update(self.route(part, params))
+            if len(shards) > 1 and any(
+                read_tables(part) <= REPLICATED for part in stmt.selects
+            ):
+                # every shard would return the copied rows once
+                raise NotImplementedError(
+                    "copied and sharded tables in one compound select"
+                )
+            return sorted(shards)
+        ids = pinned(stmt._whereclause, params)
+        if ids is None:
+            return list(range(self.shards))
+        return sorted(set(shard_of(id, self.shards) for id in ids))
+
+    def load(self, table, rows, key=None, chunk_size=CHUNK_SIZE):
+        """Insert rows in parallel, committing every chunk_size rows of a shard.
+
+        key returns the users.id a row belongs to, it defaults to the
+        sharded column; rows of REPLICATED tables go to every shard. Other
+        tables, post_keywords, need a key: the user of the row's post.
+        Chunks are sent to the shard processes while the next ones are
+        partitioned. The counters of the users whose rows, addresses or
+        posts are loaded are rebuilt once the loads are done.
+        """
+        if key is None and table.name in SHARD_KEYS:
+            column = SHARD_KEYS[table.name]
+            key = lambda row: row[column]
+        elif key is None and table.name not in REPLICATED:
+            raise ValueError("%s rows need a key, the users.id they follow" % table)
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return 0
+        # the workers get plain SQL, Python side defaults are filled in here
+        defaults = {
+            column.key: column.default.arg
+            for column in table.c
+            if column.default is not None and column.default.is_scalar
+        }
+        compiled = table.insert().compile(
+            dialect=DIALECT, column_keys=list(defaults) + list(first)
+        )
+        shards = self.shards
+        per_shard = [[] for i in range(shards)]
+        futures = []
+        # the users of each shard whose counters the rows change
+        counters = list(COUNTERS) if table.name == "users" else counters_of(table)
+        owners = [set() for i in range(shards)]
+
+        def send(shard):
+            futures.append(
+                self.executors[shard].submit(
+                    run_load, self.urls[shard], compiled.string, per_shard[shard]
+                )
+            )
+            per_shard[shard] = []
+
+        for row in chain([first], rows):
+            # insert parameters are named after their columns
+            values = tuple(
+                row[name] if name in row else defaults[name]
+                for name in compiled.positiontup
+            )
+            if key is None:
+                targets = range(shards)
+            else:
+                user_id = key(row)
+                targets = [shard_of(user_id, shards)]
+                if counters:
+                    owners[targets[0]].add(user_id)
+            for shard in targets:
+                per_shard[shard].append(values)
+                if len(per_shard[shard]) >= chunk_size:
+                    send(shard)
+        for shard in range(shards):
+            if per_shard[shard]:
+                send(shard)
+            if owners[shard]:
+                # after the loads, the shard process runs them in order
+                futures.append(
+                    self.executors[shard].submit(
+                        run_recount, self.urls[shard], owners[shard], counters
+                    )
+                )
+        return sum(future.result() for future in futures)
+
+    def execute(self, stmt, **params):
+        shards = self.route(stmt, params)
+        if len(shards) == 1:
+            # nothing to merge, the shard gets the statement as it is
+            sql, values = compile_sql(stmt, params)
+            return ShardedResult(*run_query(self.urls[shards[0]], sql, values))
+        if isinstance(stmt, CompoundSelect):
+            return self.execute_compound(stmt, shards, params)
+        return self.execute_select(stmt, shards, params)
+
+    def scatter(self, stmt, shards, params):
+        sql, values = compile_sql(stmt, params)
+        futures = [
+            self.executors[shard].submit(run_query, self.urls[shard], sql, values)
+            for shard in shards
+        ]
+        results = [future.result() for future in futures]
+        return results[0][0], [rows for keys, rows in results]
+
+    def execute_select(self, stmt, shards, params):
+        columns = list(stmt.inner_columns)
+        aggregates = [aggregate(column) for column in columns]
+        grouped = bool(stmt._group_by_clause.clauses) or any(
+            has_aggregate(column) for column in columns
+        )
+        if grouped and any(
+            sharded_column(selected(element, columns))
+            for element in stmt._group_by_clause.clauses
+        ):
+            # the groups are whole within each shard, as the rows of a select
+            grouped = False
+        if grouped:
+            if stmt._having is not None:
+                raise NotImplementedError("HAVING needs the whole groups")
+            for column, name in zip(columns, aggregates):
+                if name is None and has_aggregate(column):
+                    # the value of one of the shards would be returned
+                    raise NotImplementedError("cannot merge %s over shards" % column)
+            # groups can span shards: every shard returns all of its groups
+            keys, results = self.scatter(stmt.limit(None).offset(None), shards, params)
+            group = [
+                column_index(element, columns, keys)
+                for element in stmt._group_by_clause.clauses
+            ]
+            combiners = []
+            for i, name in enumerate(aggregates):
+                if name is not None and i not in group:
+                    combiners.append((i, COMBINE[name]))
+            rows = merge_groups(
+                (row for rows in results for row in rows), group, combiners
+            )
+            key = sort_key(stmt, columns, keys)
+            if key is not None:
+                rows.sort(key=key)
+        else:
+            # each shard returns its first offset + limit rows, sorted
+            per_shard = stmt.offset(None)
+            if stmt._limit is not None:
+                per_shard = per_shard.limit(stmt._limit + (stmt._offset or 0))
+            keys, results = self.scatter(per_shard, shards, params)
+            key = sort_key(stmt, columns, keys)
+            if key is None:
+                rows = [row for rows in results for row in rows]
+            else:
+                rows = list(heapq.merge(*results, key=key))
+        if stmt._distinct:
+            rows = distinct(rows)
+        return ShardedResult(keys, limit(stmt, rows))
+
+    def execute_compound(self, stmt, shards, params):
+        if stmt.keyword not in (CompoundSelect.UNION, CompoundSelect.UNION_ALL):
+            raise NotImplementedError("%s over several shards" % stmt.keyword)
+        keys, results = self.scatter(stmt.limit(None).offset(None), shards, params)
+        rows = [row for rows in results for row in rows]
+        if stmt.keyword is CompoundSelect.UNION:
+            rows = distinct(rows)
+        key = sort_key(stmt, list(stmt.selects[0].inner_columns), keys)
+        if key is not None:
+            rows.sort(key=key)
+        return ShardedResult(keys, limit(stmt, rows))
+
+    def session(self, **kwargs):
+        """A Session sending each instance and query to its shards."""
+
+        def shard_chooser(mapper, instance, clause=None):
+            if isinstance(instance, User):
+                user_id = instance.id
+            elif isinstance(instance, (Address, BlogPost)):
+                user_id = instance.user_id
+                if user_id is None:
+                    owner = (
+                        instance.user
+                        if isinstance(instance, Address)
+                        else instance.author
+                    )
+                    user_id = owner.id if owner is not None else None
+            else:
+                raise NotImplementedError(
+                    "%s rows are copied to every shard, use load()" % mapper.class_
+                )
+            if user_id is None:
+                raise ValueError("set the users.id of %r to pick its shard" % instance)
+            return shard_of(user_id, self.shards)
+
+        def id_chooser(query, ident):
+            if query._mapper_zero().class_ is User:
+                return [shard_of(ident[0], self.shards)]
+            return list(range(self.shards))
+
+        def query_chooser(query):
+            ids = pinned(query._criterion, query._params)
+            if ids is None:
+                return list(range(self.shards))
+            return sorted(set(shard_of(id, self.shards) for id in ids))
+
+        return ShardedSession(
+            shard_chooser=shard_chooser,
+            id_chooser=id_chooser,
+            query_chooser=query_chooser,
+            shards={shard: self.engine(shard) for shard in range(self.shards)},
+            **kwargs
+        )
+
+    def dispose(self):
+        for executor in self.executors:
+            executor.shutdown()
+        for engine in self.engines.values():
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    from sqlalchemy import desc, union
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    shards = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    users = User.__table__
+    keywords = Keyword.__table__
+    keyword_rows = [{"id": 1, "keyword": "firstpost"}, {"id": 2, "keyword": "wendy"}]
+    addresses = Address.__table__
+    domains = ("aol.com", "msn.com", "yahoo.com", "google.com")
+
+    def user_rows():
+        return (
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(1, count + 1)
+        )
+
+    def address_rows():
+        return (
+            {
+                "id": i + 1,
+                "user_id": i // 2 + 1,
+                "email_address": "user%d@%s" % (i // 2 + 1, domains[i % 4]),
+            }
+            for i in range(count * 2)
+        )
+
+    queries = OrderedDict(
+        [
+            (
+                "num_addresses top 10",
+                select(
+                    [
+                        addresses.c.user_id,
+                        func.count(addresses.c.id).label("num_addresses"),
+                    ]
+                )
+                .group_by("user_id")
+                .order_by(desc("num_addresses"), "user_id")
+                .limit(10),
+            ),
+            (
+                "count per domain",
+                select(
+                    [
+                        func.substr(
+                            addresses.c.email_address,
+                            func.instr(addresses.c.email_address, "@") + 1,
+                        ).label("domain"),
+                        func.count().label("count"),
+                    ]
+                )
+                .group_by("domain")
+                .order_by("domain"),
+            ),
+            (
+                "names ORDER BY LIMIT",
+                select([users.c.name]).order_by(users.c.name).limit(5).offset(5),
+            ),
+            (
+                "union",
+                union(
+                    addresses.select().where(
+                        addresses.c.email_address.like("%@aol.com")
+                    ),
+                    addresses.select().where(addresses.c.email_address.like("user1%")),
+                ).order_by(addresses.c.email_address),
+            ),
+            ("user by id", select([users]).where(users.c.id == count // 2)),
+            (
+                "upper names",
+                select([func.upper(users.c.name).label("upper_name")])
+                .order_by("upper_name")
+                .limit(5),
+            ),
+            ("count keywords", select([func.count()]).select_from(keywords)),
+        ]
+    )
+
+    directory = tempfile.mkdtemp()
+    single = create_sqlite_engine(
+        "sqlite:///%s" % os.path.join(directory, "single.sqlite3")
+    )
+    Base.metadata.create_all(single)
+    db = ShardedDatabase(directory, shards)
+    db.create_all()
+    # start the shard processes, SQLAlchemy takes a while to import
+    db.execute(select([func.count()]).select_from(users))
+
+    print("----------------------------------------")
+    print("Load %d users, %d addresses" % (count, count * 2))
+    print("----------------------------------------")
+    start = time.perf_counter()
+    with single.begin() as conn:
+        for chunk in chunked(user_rows()):
+            conn.execute(users.insert(), chunk)
+        for chunk in chunked(address_rows()):
+            conn.execute(addresses.insert(), chunk)
+        conn.execute(keywords.insert(), keyword_rows)
+        # load() rebuilds the counters of the shards
+        rebuild(conn)
+    print("single file: %.2f s" % (time.perf_counter() - start))
+    start = time.perf_counter()
+    db.load(users, user_rows())
+    db.load(addresses, address_rows())
+    db.load(keywords, keyword_rows)
+    print("%d shards:    %.2f s" % (shards, time.perf_counter() - start))
+
+    print("----------------------------------------")
+    print("Queries, single file vs %d shards" % shards)
+    print("----------------------------------------")
+    for name, stmt in queries.items():
+        with single.connect() as conn:
+            start = time.perf_counter()
+            expected = [tuple(row) for row in conn.execute(stmt)]
+            seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = db.execute(stmt).fetchall()
+        sharded = time.perf_counter() - start
+        print(
+            "%-22s %9.2f ms %9.2f ms  %s"
+            % (
+                name,
+                seconds * 1000,
+                sharded * 1000,
+                "same rows" if rows == expected else "DIFFERENT",
+            )
+        )
+
+    print("----------------------------------------")
+    print("Aggregates that do not merge")
+    print("----------------------------------------")
+    for stmt in (
+        select([func.count(users.c.name.distinct())]),
+        select([func.coalesce(func.sum(users.c.id), 0)]),
+        select([func.avg(users.c.id)]),
+    ):
+        try:
+            db.execute(stmt)
+        except NotImplementedError as e:
+            print(e)
+
+    print("----------------------------------------")
+    print("ORM primary key lookups")
+    print("----------------------------------------")
+    session = db.session()
+    user = session.query(User).get(count // 3)
+    print(user, user.addresses)
+    print(session.query(User).filter(User.id.in_([1, 2, 3])).all())
+    user.addresses.append(Address(email_address="new@example.com"))
+    session.commit()
+    print(db.execute(select([addresses]).where(addresses.c.user_id == user.id)).rows)
+    db.dispose()
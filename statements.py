@@ -0,0 +1,157 @@
+import sys
+import timeit
+from collections import OrderedDict
+
+from sqlalchemy import and_, bindparam, create_engine, select, union
+
+from model.tables import addresses, metadata, users
+
+
+class StatementCache(object):
+    """Named statements, built once and compiled once per dialect (LRU bounded)."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.builders = {}
+        self.statements = {}
+        self.compiled = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, builder):
+        self.builders[name] = builder
+        self.statements.pop(name, None)
+        for key in [key for key in self.compiled if key[0] == name]:
+            del self.compiled[key]
+        return builder
+
+    def statement(self, name):
+        try:
+            return self.statements[name]
+        except KeyError:
+            stmt = self.statements[name] = self.builders[name]()
+            return stmt
+
+    def compile(self, name, dialect):
+        key = (name, dialect)
+        try:
+            compiled = self.compiled[key]
+        except KeyError:
+            self.misses += 1
+            compiled = self.compiled[key] = self.statement(name).compile(
+                dialect=dialect
+            )
+            if len(self.compiled) > self.maxsize:
+                self.compiled.popitem(last=False)
+        else:
+            self.hits += 1
+            self.compiled.move_to_end(key)
+        return compiled
+
+    def execute(self, conn, name, *multiparams, **params):
+        return conn.execute(self.compile(name, conn.dialect), *multiparams, **params)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.compiled),
+            "maxsize": self.maxsize,
+        }
+
+
+def users_with_addresses():
+    return select([users, addresses]).where(users.c.id == addresses.c.user_id)
+
+
+def users_with_two_addresses():
+    a1 = addresses.alias()
+    a2 = addresses.alias()
+    return select([users]).where(
+        and_(
+            users.c.id == a1.c.user_id,
+            users.c.id == a2.c.user_id,
+            a1.c.email_address == bindparam("email1"),
+            a2.c.email_address == bindparam("email2"),
+        )
+    )
+
+
+def addresses_union():
+    return union(
+        addresses.select().where(addresses.c.email_address == bindparam("email")),
+        addresses.select().where(addresses.c.email_address.like(bindparam("pattern"))),
+    ).order_by(addresses.c.email_address)
+
+
+def rename_users():
+    return (
+        users.update()
+        .where(users.c.name == bindparam("oldname"))
+        .values(name=bindparam("newname"))
+    )
+
+
+def delete_users_like():
+    return users.delete().where(users.c.name.like(bindparam("pattern")))
+
+
+statements = StatementCache()
+statements.register("users_with_addresses", users_with_addresses)
+statements.register("users_with_two_addresses", users_with_two_addresses)
+statements.register("addresses_union", addresses_union)
+statements.register("rename_users", rename_users)
+statements.register("delete_users_like", delete_users_like)
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    conn = engine.connect()
+    conn.execute(
+        users.insert(),
+        [
+            {"id": i, "name": "user%d" % i, "fullname": "User %d" % i}
+            for i in range(100)
+        ],
+    )
+    conn.execute(
+        addresses.insert(),
+        [
+            {"user_id": i // 2, "email_address": "user%d@yahoo.com" % i}
+            for i in range(200)
+        ],
+    )
+
+    patterns = [
+        ("select", "users_with_addresses", {}),
+        (
+            "alias",
+            "users_with_two_addresses",
+            {"email1": "user0@yahoo.com", "email2": "user1@yahoo.com"},
+        ),
+        (
+            "union",
+            "addresses_union",
+            {"email": "foo@bar.com", "pattern": "%@yahoo.com"},
+        ),
+        ("update", "rename_users", {"oldname": "user1", "newname": "user1"}),
+        ("delete", "delete_users_like", {"pattern": "nobody%"}),
+    ]
+
+    print("----------------------------------------")
+    print("Rebuild every time vs. compiled statement cache (%d runs)" % number)
+    print("----------------------------------------")
+    for label, name, params in patterns:
+        builder = statements.builders[name]
+        rebuilt = timeit.timeit(lambda: conn.execute(builder(), params), number=number)
+        cached = timeit.timeit(
+            lambda: statements.execute(conn, name, params), number=number
+        )
+        print(
+            "%-7s rebuilt: %7.1f us  cached: %7.1f us  speedup: %.1fx"
+            % (label, rebuilt / number * 1e6, cached / number * 1e6, rebuilt / cached)
+        )
+    print(statements.stats())
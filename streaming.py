@@ -0,0 +1,127 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from bulkload import chunked
+from model.orm import Base, User
+
+BATCH_SIZE = 1000
+
+
+def stream(conn, stmt, batch_size=BATCH_SIZE, **params):
+    """Yield lists of at most batch_size rows of a Core statement.
+
+    stream_results asks for a server-side cursor where the DBAPI has one;
+    pysqlite steps through the result lazily anyway, so only one batch of
+    rows is held in memory at a time.
+    """
+    result = conn.execution_options(stream_results=True).execute(stmt, **params)
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        result.close()
+
+
+def stream_query(query, batch_size=BATCH_SIZE):
+    """Yield lists of at most batch_size results of an ORM query.
+
+    Instances of previous batches are only weakly referenced by the identity
+    map, so they are released once the caller drops them.
+    """
+    results = iter(query.yield_per(batch_size))
+    while True:
+        batch = list(islice(results, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iterate(batches):
+    for batch in batches:
+        for row in batch:
+            yield row
+
+
+def measure(consume):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first, count = consume()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first - start, seconds, count, peak
+
+
+def consume_rows(rows):
+    # count the rows, noting when the first one arrived
+    rows = iter(rows)
+    first = None
+    count = 0
+    for row in rows:
+        if first is None:
+            first = time.perf_counter()
+        count += 1
+    return first, count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    engine = create_engine(
+        "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "streaming.sqlite3")
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for chunk in chunked(
+            {"name": "user%d" % i, "fullname": "User %d" % i, "nickname": "u%d" % i}
+            for i in range(count)
+        ):
+            conn.execute(User.__table__.insert(), chunk)
+    Session = sessionmaker(bind=engine)
+
+    def core_fetchall():
+        with engine.connect() as conn:
+            return consume_rows(conn.execute(select([User.__table__])).fetchall())
+
+    def core_stream():
+        with engine.connect() as conn:
+            return consume_rows(iterate(stream(conn, select([User.__table__]))))
+
+    def orm_all():
+        session = Session()
+        try:
+            return consume_rows(session.query(User).all())
+        finally:
+            session.close()
+
+    def orm_stream():
+        session = Session()
+        try:
+            return consume_rows(iterate(stream_query(session.query(User))))
+        finally:
+            session.close()
+
+    print("----------------------------------------")
+    print("Scan %d users" % count)
+    print("----------------------------------------")
+    for label, consume in (
+        ("core fetchall()", core_fetchall),
+        ("core stream()", core_stream),
+        ("orm all()", orm_all),
+        ("orm stream_query()", orm_stream),
+    ):
+        first, seconds, rows, peak = measure(consume)
+        print(
+            "%-20s first row: %9.2f ms  total: %6.2f s  rows: %d  peak: %7.1f MB"
+            % (label, first * 1000, seconds, rows, peak / 1024.0 / 1024.0)
+        )
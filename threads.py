@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from bulkload import chunked
+from engines import create_reader_engine, create_sqlite_engine
+from model.orm import Base, User
+
+
+def is_locked(error):
+    return "database is locked" in str(error.orig)
+
+
+class Database(object):
+    """Thread-local sessions over a writer pool and a read-only reader pool.
+
+    With WAL, readers never block the writer nor each other, so they get a
+    pool of their own sized for the worker threads; SQLite takes one writer
+    at a time, so writes share a single pooled connection and queue on the
+    pool instead of on the file lock.
+    """
+
+    def __init__(self, url, profile="wal", readers=16, attempts=8, backoff=0.01):
+        self.writer = create_sqlite_engine(url, profile, pool_timeout=60)
+        self.reader = create_reader_engine(url, profile, pool_size=readers)
+        self.Session = scoped_session(sessionmaker(bind=self.writer))
+        self.ReadSession = scoped_session(sessionmaker(bind=self.reader))
+        self.attempts = attempts
+        self.backoff = backoff
+
+    def run(self, registry, fn, commit):
+        """Call fn(session) in this thread's session, retrying when locked."""
+        for attempt in range(self.attempts):
+            session = registry()
+            try:
+                result = fn(session)
+                if commit:
+                    session.commit()
+                return result
+            except OperationalError as error:
+                session.rollback()
+                if not is_locked(error) or attempt == self.attempts - 1:
+                    raise
+                # exponential backoff with jitter so retries do not collide
+                time.sleep(self.backoff * (2**attempt) * random.random())
+            finally:
+                registry.remove()
+
+    def read(self, fn):
+        return self.run(self.ReadSession, fn, commit=False)
+
+    def write(self, fn):
+        return self.run(self.Session, fn, commit=True)
+
+    def dispose(self):
+        self.Session.remove()
+        self.ReadSession.remove()
+        self.writer.dispose()
+        self.reader.dispose()
+
+
+def throughput(db, threads, operations, operation):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda i: operation(db, i), range(operations)))
+    return operations / (time.perf_counter() - start)
+
+
+def read_user(db, i):
+    return db.read(lambda session: session.query(User).get(i % 10000 + 1).name)
+
+
+def add_user(db, i):
+    db.write(lambda session: session.add(User(name="new%d" % i)))
+
+
+if __name__ == "__main__":
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    url = "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "threads.sqlite3")
+    db = Database(url)
+    Base.metadata.create_all(db.writer)
+    with db.writer.begin() as conn:
+        for chunk in chunked({"name": "user%d" % i} for i in range(10000)):
+            conn.execute(User.__table__.insert(), chunk)
+
+    print("----------------------------------------")
+    print("Operations/sec by worker threads (%d operations)" % operations)
+    print("----------------------------------------")
+    for threads in (1, 2, 4, 8, 16):
+        print(
+            "%2d threads  reads: %7.0f/sec  writes: %7.0f/sec"
+            % (
+                threads,
+                throughput(db, threads, operations, read_user),
+                throughput(db, threads, operations, add_user),
+            )
+        )
+    db.dispose()